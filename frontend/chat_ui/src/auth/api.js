@@ -116,8 +116,8 @@ export const RAGAPI = {
     })
     return data
   },
-  async getDocuments() {
-    const { data } = await api.get('/documents/')
+  async getDocuments({ cursor, limit } = {}) {
+    const { data } = await api.get('/documents/', { params: { cursor, limit } })
     return data
   },
   async deleteDocument(documentId) {
@@ -3,7 +3,9 @@ import { RAGAPI } from '../auth/api'
 
 export default function DocumentSidebar({ isOpen, onClose }) {
   const [documents, setDocuments] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
   const [loading, setLoading] = useState(false)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [deletingId, setDeletingId] = useState(null)
   const [showDeleteConfirm, setShowDeleteConfirm] = useState(null)
 
@@ -18,6 +20,7 @@ export default function DocumentSidebar({ isOpen, onClose }) {
     try {
       const response = await RAGAPI.getDocuments()
       setDocuments(response.documents || [])
+      setNextCursor(response.next_cursor || null)
     } catch (error) {
       console.error('Error fetching documents:', error)
     } finally {
@@ -25,6 +28,20 @@ export default function DocumentSidebar({ isOpen, onClose }) {
     }
   }
 
+  const fetchMoreDocuments = async () => {
+    if (!nextCursor) return
+    setLoadingMore(true)
+    try {
+      const response = await RAGAPI.getDocuments({ cursor: nextCursor })
+      setDocuments(docs => [...docs, ...(response.documents || [])])
+      setNextCursor(response.next_cursor || null)
+    } catch (error) {
+      console.error('Error fetching documents:', error)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
+
   const handleDeleteClick = (documentId, documentTitle) => {
     setShowDeleteConfirm({ id: documentId, title: documentTitle })
   }
@@ -179,6 +196,15 @@ export default function DocumentSidebar({ isOpen, onClose }) {
                   </div>
                 </div>
               ))}
+              {nextCursor && (
+                <button
+                  onClick={fetchMoreDocuments}
+                  disabled={loadingMore}
+                  className="w-full py-2 text-sm text-blue-600 hover:text-blue-800 disabled:opacity-50"
+                >
+                  {loadingMore ? 'Loading...' : 'Load more'}
+                </button>
+              )}
             </div>
           )}
         </div>
@@ -6,8 +6,11 @@ from django.utils.safestring import mark_safe
 from django.shortcuts import get_object_or_404, redirect
 from django.contrib import messages
 from django.http import HttpResponseRedirect
-from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
 from .models import Document
+from .chunkstore import delete_document_chunks
+from .snapshots import vectorstore_lock
 import os
 import shutil
 
@@ -33,14 +36,21 @@ class UserAdmin(admin.ModelAdmin):
         ('Important dates', {'fields': ('last_login', 'date_joined')}),
     )
     
+    def get_queryset(self, request):
+        """Count active documents in the changelist query instead of once per row"""
+        return super().get_queryset(request).annotate(
+            active_document_count=Count('documents', filter=Q(documents__is_active=True))
+        )
+    
     def document_count(self, obj):
         """Show number of documents uploaded by this user"""
-        count = obj.documents.filter(is_active=True).count()
+        count = obj.active_document_count
         if count > 0:
             url = reverse('admin:chatbot_document_changelist') + f'?user__id__exact={obj.id}'
             return format_html('<a href="{}">{} documents</a>', url, count)
         return '0 documents'
     document_count.short_description = 'Documents'
+    document_count.admin_order_field = 'active_document_count'
 
 @admin.register(Document)
 class DocumentAdmin(admin.ModelAdmin):
@@ -50,6 +60,7 @@ class DocumentAdmin(admin.ModelAdmin):
     ordering = ('-upload_date',)
     readonly_fields = ('upload_date', 'last_modified', 'file_size_human')
     list_per_page = 25
+    list_select_related = ('user',)
     
     fieldsets = (
         (None, {
@@ -116,52 +127,19 @@ class DocumentAdmin(admin.ModelAdmin):
             return redirect('admin:chatbot_document_changelist')
         
         try:
-            # Delete from Chroma DB if collection ID exists
-            if document.chroma_collection_id:
-                self._delete_from_chroma_db(document.chroma_collection_id)
-                messages.success(request, f'Document "{document.title}" deleted from Chroma DB successfully.')
-            else:
-                messages.warning(request, f'Document "{document.title}" was not found in Chroma DB.')
-            
+            # Same path as the API: chunks and soft delete change together under the vector store lock
+            with vectorstore_lock(), transaction.atomic():
+                delete_document_chunks(document.id)
+                document.is_active = False
+                document.save()
+            messages.success(request, f'Document "{document.title}" deleted from Chroma DB successfully.')
+
             # Delete the physical file
             if document.file_path and os.path.exists(document.file_path):
                 os.remove(document.file_path)
                 messages.success(request, f'Physical file "{document.filename}" deleted successfully.')
-            
-            # Mark document as inactive (soft delete)
-            document.is_active = False
-            document.save()
-            
+
         except Exception as e:
             messages.error(request, f'Error deleting document: {str(e)}')
         
         return redirect('admin:chatbot_document_changelist')
-    
-    def _delete_from_chroma_db(self, collection_id):
-        """Helper method to delete from Chroma DB"""
-        try:
-            from langchain_community.vectorstores import Chroma
-            from langchain_community.embeddings import HuggingFaceEmbeddings
-            
-            # Initialize embeddings
-            if settings.RAG_EMBEDDINGS_PROVIDER == 'openai':
-                from langchain_openai import OpenAIEmbeddings
-                embeddings = OpenAIEmbeddings()
-            else:
-                embeddings = HuggingFaceEmbeddings(
-                    model_name=settings.RAG_HF_MODEL_NAME
-                )
-            
-            # Initialize Chroma
-            persist_directory = settings.CHROMA_PERSIST_DIR
-            vectorstore = Chroma(
-                collection_name=collection_id,
-                embedding_function=embeddings,
-                persist_directory=persist_directory
-            )
-            
-            # Delete the collection
-            vectorstore.delete_collection()
-            
-        except Exception as e:
-            raise Exception(f"Failed to delete from Chroma DB: {str(e)}")
@@ -0,0 +1,167 @@
+"""
+Content-addressed chunk text storage and compact vector store metadata.
+
+Chroma entries hold only the embedding and a small integer-keyed metadata
+dict; the chunk text lives once per distinct content in ``ChunkText`` and the
+source label on the ``Document`` row. Identical chunks from re-uploaded or
+shared files therefore share one stored text (and one computed embedding).
+
+Compact metadata keys (all integers):
+
+    u  user id        d  document id
+    p  page (PDFs)    t  ChunkText id
+"""
+import hashlib
+from collections import Counter
+from typing import Dict, List
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import ChunkText, Document
+
+
+USER_KEY = 'u'
+DOCUMENT_KEY = 'd'
+PAGE_KEY = 'p'
+TEXT_KEY = 't'
+
+
+def text_digest(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def store_texts(texts: List[str]) -> List[int]:
+    """Store ``texts`` (deduplicated by content) and return their ``ChunkText`` ids.
+
+    Every occurrence counts as one reference, so ``release_texts`` with the
+    returned ids undoes the call. Call it inside the transaction that writes
+    the referencing vector store entries, so a failed write rolls the
+    references back.
+    """
+    digests = [text_digest(t) for t in texts]
+    unique = dict(zip(digests, texts))
+    with transaction.atomic():
+        while True:
+            ChunkText.objects.bulk_create(
+                [ChunkText(digest=d, text=t) for d, t in unique.items()], ignore_conflicts=True
+            )
+            # Row locks keep a concurrent release_texts from deleting a row before we count our reference
+            ids_by_digest = dict(
+                ChunkText.objects.select_for_update().filter(digest__in=unique).values_list('digest', 'id')
+            )
+            if len(ids_by_digest) == len(unique):
+                break  # otherwise a release deleted a row between our insert and lock: insert it again
+        text_ids = [ids_by_digest[d] for d in digests]
+        _adjust_refs(Counter(text_ids), +1)
+    return text_ids
+
+
+def release_texts(text_ids: List[int]):
+    """Drop one reference per id and delete texts nothing refers to any more."""
+    if not text_ids:
+        return
+    with transaction.atomic():
+        list(ChunkText.objects.select_for_update().filter(id__in=set(text_ids)).values_list('id', flat=True))
+        _adjust_refs(Counter(text_ids), -1)
+        ChunkText.objects.filter(id__in=set(text_ids), ref_count__lte=0).delete()
+
+
+def reconcile_ref_counts(collection, page_size: int = 5000) -> int:
+    """Recount references from the vector store itself and drop unreferenced texts.
+
+    Repairs counts left behind by an interrupted write; callers must hold the
+    vector store lock exclusively. Returns the number of texts deleted.
+    """
+    counts = Counter()
+    offset = 0
+    while True:
+        page = collection.get(include=['metadatas'], limit=page_size, offset=offset)
+        counts.update(m[TEXT_KEY] for m in page['metadatas'] if m and TEXT_KEY in m)
+        if len(page['ids']) < page_size:
+            break
+        offset += page_size
+    with transaction.atomic():
+        ChunkText.objects.update(ref_count=0)
+        _adjust_refs(counts, +1)
+        deleted, _ = ChunkText.objects.filter(ref_count=0).delete()
+    return deleted
+
+
+def _adjust_refs(counts: Counter, sign: int):
+    by_count = {}
+    for text_id, n in counts.items():
+        by_count.setdefault(n, []).append(text_id)
+    for n, ids in by_count.items():
+        for start in range(0, len(ids), 500):  # stay under the database's query parameter limit
+            ChunkText.objects.filter(id__in=ids[start:start + 500]).update(ref_count=F('ref_count') + sign * n)
+
+
+def delete_document_chunks(document_id: int) -> int:
+    """Delete a document's chunks from the vector store and release their texts.
+
+    Raises if the vector store can't be updated, so callers don't mark the
+    document deleted while its chunks stay searchable. Callers hold
+    ``vectorstore_lock``. Returns the number of chunks deleted.
+    """
+    from .views import _get_vectorstore
+
+    collection = _get_vectorstore()._collection
+    result = collection.get(where={DOCUMENT_KEY: {'$eq': int(document_id)}}, include=['metadatas'])
+    if not result['ids']:
+        return 0
+    # The released references roll back if the delete fails
+    with transaction.atomic():
+        release_texts([m[TEXT_KEY] for m in result['metadatas'] if m and TEXT_KEY in m])
+        collection.delete(ids=result['ids'])
+    return len(result['ids'])
+
+
+def compact_metadata(user_id: int, document_id: int, text_id: int, page=None) -> dict:
+    metadata = {USER_KEY: int(user_id), DOCUMENT_KEY: int(document_id), TEXT_KEY: int(text_id)}
+    if isinstance(page, int):
+        metadata[PAGE_KEY] = page
+    return metadata
+
+
+def hydrate(metadatas: List[dict]) -> List[tuple]:
+    """Resolve compact metadata into ``(text, metadata)`` with the public metadata
+    shape (``source``, ``page``, ``user_id``, ``document_id``). Two queries per call."""
+    metadatas = [m or {} for m in metadatas]
+    texts: Dict[int, str] = dict(
+        ChunkText.objects.filter(id__in={m.get(TEXT_KEY) for m in metadatas}).values_list('id', 'text')
+    )
+    documents = Document.objects.only('id', 'source', 'filename').in_bulk(
+        {m.get(DOCUMENT_KEY) for m in metadatas}
+    )
+    hydrated = []
+    for m in metadatas:
+        doc = documents.get(m.get(DOCUMENT_KEY))
+        metadata = {
+            'source': (doc.source or doc.filename) if doc else None,
+            'user_id': str(m.get(USER_KEY)),
+            'document_id': str(m.get(DOCUMENT_KEY)),
+        }
+        if PAGE_KEY in m:
+            metadata['page'] = m[PAGE_KEY]
+        hydrated.append((texts.get(m.get(TEXT_KEY), ''), metadata))
+    return hydrated
+
+
+def existing_embeddings(collection, texts: List[str]) -> Dict[str, list]:
+    """Embeddings already stored for any of ``texts``, keyed by text, so duplicates aren't re-embedded."""
+    texts_by_id = {
+        text_id: text
+        for text_id, text in ChunkText.objects.filter(
+            digest__in={text_digest(t) for t in texts}
+        ).values_list('id', 'text')
+    }
+    if not texts_by_id:
+        return {}
+    result = collection.get(
+        where={TEXT_KEY: {'$in': sorted(texts_by_id)}}, include=['metadatas', 'embeddings']
+    )
+    found = {}
+    for metadata, embedding in zip(result['metadatas'], result['embeddings']):
+        found.setdefault(texts_by_id[metadata[TEXT_KEY]], list(embedding))
+    return found
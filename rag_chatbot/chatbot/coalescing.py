@@ -0,0 +1,96 @@
+"""
+Single-flight coalescing of identical concurrent queries.
+
+When many users of the same corpus ask the same question at once, only the
+first request (the leader) runs retrieval and generation; identical requests
+arriving while it is in flight wait for and share its result. Waiters can be
+threads (WSGI workers) or asyncio tasks (ASGI), in any combination, because the
+shared result lives in a ``concurrent.futures.Future``.
+"""
+import asyncio
+import hashlib
+import json
+import threading
+from collections import Counter
+from concurrent.futures import Future
+
+
+def normalize_query(query: str) -> str:
+    return ' '.join(query.casefold().split())
+
+
+def coalescing_key(scope, query: str, params: dict) -> str:
+    """Key identical requests: same visible corpus, same normalized query, same parameters."""
+    raw = json.dumps([list(scope), normalize_query(query), params], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = Counter()
+
+    def do(self, key, fn):
+        """Call ``fn()`` once for concurrent callers with the same key.
+
+        Returns ``(result, coalesced)`` where ``coalesced`` is True for callers
+        that reused another caller's result. Exceptions are shared the same way.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return future.result(), True
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, future, exception=e)
+            raise
+        self._finish(key, future, result=result)
+        return result, False
+
+    async def do_async(self, key, coro_fn):
+        """Asyncio counterpart of :meth:`do`; ``coro_fn()`` must return an awaitable."""
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future), True
+        try:
+            result = await coro_fn()
+        except BaseException as e:
+            self._finish(key, future, exception=e)
+            raise
+        self._finish(key, future, result=result)
+        return result, False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'leaders': self._stats['leaders'],
+                'coalesced': self._stats['coalesced'],
+                'in_flight': len(self._calls),
+            }
+
+    def _join(self, key):
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self._stats['coalesced'] += 1
+                return future, False
+            future = self._calls[key] = Future()
+            self._stats['leaders'] += 1
+            return future, True
+
+    def _finish(self, key, future, result=None, exception=None):
+        # Stop new callers from joining before publishing the outcome
+        with self._lock:
+            self._calls.pop(key, None)
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+
+_query_coalescer = SingleFlight()
+
+
+def get_query_coalescer() -> SingleFlight:
+    return _query_coalescer
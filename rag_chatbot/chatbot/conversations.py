@@ -0,0 +1,59 @@
+"""
+Context reuse and history budgeting for conversation follow-up questions.
+
+A follow-up ("what about section 3?") usually needs the chunks an earlier turn
+already retrieved. Those chunks are re-scored against the new query vector; if
+enough of them are close, the vector search is skipped entirely, otherwise a
+search extends them. The conversation history sent to the LLM is kept within a
+token budget: recent turns verbatim, older turns as their question only.
+"""
+from typing import List
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token for English text)."""
+    return (len(text) + 3) // 4
+
+
+def recent_chunk_ids(turns: List, limit: int = 3) -> List[str]:
+    """Chunk ids used by the last ``limit`` turns, most recent turn first, deduplicated."""
+    ids = []
+    for turn in list(turns)[-limit:][::-1]:
+        ids.extend(turn.chunk_ids)
+    return list(dict.fromkeys(ids))
+
+
+def squared_l2(a, b) -> float:
+    """Distance in the same space Chroma uses for the collection ('l2' is squared)."""
+    return float(sum((x - y) * (x - y) for x, y in zip(a, b)))
+
+
+def merge_results(reused: List, searched: List, top_k: int) -> List:
+    """Merge ``(doc, distance)`` lists by chunk id, keeping the ``top_k`` closest."""
+    merged = {}
+    for doc, dist in list(reused) + list(searched):
+        if doc.id not in merged or dist < merged[doc.id][1]:
+            merged[doc.id] = (doc, dist)
+    return sorted(merged.values(), key=lambda x: x[1])[:top_k]
+
+
+def build_history(turns: List, token_budget: int) -> str:
+    """Render previous turns, newest kept first, within ``token_budget`` tokens.
+
+    Turns that don't fit verbatim are reduced to their question; once even that
+    doesn't fit, older turns are dropped.
+    """
+    lines = []
+    used = 0
+    for turn in list(turns)[::-1]:
+        full = f"User: {turn.query}\nAssistant: {turn.answer}"
+        short = f"User: {turn.query}"
+        for candidate in (full, short):
+            cost = estimate_tokens(candidate)
+            if used + cost <= token_budget:
+                lines.append(candidate)
+                used += cost
+                break
+        else:
+            break
+    return "\n".join(reversed(lines))
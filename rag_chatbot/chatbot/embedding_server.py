@@ -0,0 +1,258 @@
+"""
+Local embedding server shared by all web workers on a host.
+
+Every Django worker that loads its own sentence-transformers model pays for a
+full copy of the weights, and requests arriving on different workers are never
+batched together. The server below owns the only model instance, listens on a
+Unix socket and micro-batches concurrent requests inside a short time window.
+Vectors are handed back through a ``multiprocessing.shared_memory`` segment so
+large batches do not have to be serialized through the socket.
+
+Wire protocol (all frames are a 4-byte big-endian length followed by JSON):
+
+    client -> {"op": "embed", "texts": [...]}
+    server -> {"shm": "<segment name>", "rows": n, "dim": d}   (float32, row-major)
+    client -> b"\\x01"   once the vectors are copied out; the server then unlinks
+
+    client -> {"op": "stats"}
+    server -> {"requests": ..., "batches": ..., "texts": ...}
+"""
+import array
+import asyncio
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct('>I')
+_ACK = b'\x01'
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> dict:
+    header = await reader.readexactly(_HEADER.size)
+    (length,) = _HEADER.unpack(header)
+    return json.loads(await reader.readexactly(length))
+
+
+async def _write_frame(writer: asyncio.StreamWriter, message: dict):
+    body = json.dumps(message).encode('utf-8')
+    writer.write(_HEADER.pack(len(body)) + body)
+    await writer.drain()
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            raise ConnectionError('Embedding server closed the connection')
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def _send_frame(sock: socket.socket, message: dict):
+    body = json.dumps(message).encode('utf-8')
+    sock.sendall(_HEADER.pack(len(body)) + body)
+
+
+def _recv_frame(sock: socket.socket) -> dict:
+    (length,) = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+    return json.loads(_recv_exactly(sock, length))
+
+
+class EmbeddingServer:
+    """Serve ``embeddings`` over a Unix socket with time-windowed micro-batching."""
+
+    def __init__(self, embeddings, socket_path: str, batch_window: float = 0.005, max_batch_size: int = 64):
+        self.embeddings = embeddings
+        self.socket_path = socket_path
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.stats = {'requests': 0, 'batches': 0, 'texts': 0}
+        # A single thread owns the model so batches never run concurrently
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='embed')
+        self._queue = None
+
+    async def serve_forever(self):
+        self._queue = asyncio.Queue()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self._handle_client, path=self.socket_path)
+        os.chmod(self.socket_path, 0o660)
+        batcher = asyncio.create_task(self._batch_loop())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            self._executor.shutdown(wait=False)
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await _read_frame(reader)
+                except asyncio.IncompleteReadError:
+                    break
+
+                if request.get('op') == 'stats':
+                    await _write_frame(writer, self.stats)
+                    continue
+
+                texts = [str(t) for t in request.get('texts') or []]
+                future = asyncio.get_running_loop().create_future()
+                self.stats['requests'] += 1
+                await self._queue.put((texts, future))
+                try:
+                    vectors = await future
+                except Exception as e:
+                    await _write_frame(writer, {'error': str(e)})
+                    continue
+
+                dim = len(vectors[0]) if vectors else 0
+                flat = array.array('f', (value for vector in vectors for value in vector))
+                shm = shared_memory.SharedMemory(create=True, size=max(1, len(flat) * flat.itemsize))
+                try:
+                    shm.buf[:len(flat) * flat.itemsize] = flat.tobytes()
+                    await _write_frame(writer, {'shm': shm.name, 'rows': len(vectors), 'dim': dim})
+                    await reader.readexactly(len(_ACK))
+                finally:
+                    shm.close()
+                    shm.unlink()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            size = len(batch[0][0])
+            deadline = loop.time() + self.batch_window
+            while size < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            texts = [text for item_texts, _ in batch for text in item_texts]
+            try:
+                vectors = await loop.run_in_executor(self._executor, self.embeddings.embed_documents, texts)
+            except Exception as e:
+                logger.exception('Embedding batch of %d texts failed', len(texts))
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.stats['batches'] += 1
+            self.stats['texts'] += len(texts)
+            offset = 0
+            for item_texts, future in batch:
+                if not future.done():
+                    future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+
+class EmbeddingServerClient(Embeddings):
+    """LangChain ``Embeddings`` implementation backed by :class:`EmbeddingServer`.
+
+    ``fallback`` is an optional factory for an in-process embeddings object used
+    when no server is listening, so a missing server degrades to the old
+    per-worker behaviour instead of failing requests. A server that is merely
+    busy is never bypassed: loading a second model copy under load is what the
+    server exists to avoid. Texts are sent in requests of at most
+    ``max_request_texts`` so ``timeout`` bounds a single batch, not a whole upload.
+    """
+
+    def __init__(self, socket_path: str, timeout: float = 30.0, fallback=None, max_request_texts: int = 64):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.max_request_texts = max(1, max_request_texts)
+        self._fallback_factory = fallback
+        self._fallback = None
+        self._fallback_lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        texts = list(texts)
+        try:
+            sock = self._connect()
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            if self._fallback_factory is None:
+                raise
+            logger.warning('Embedding server at %s unavailable (%s); embedding in-process', self.socket_path, e)
+            return self._get_fallback().embed_documents(texts)
+
+        # Timeouts and errors once connected propagate: the server is up, just busy or failing
+        vectors = []
+        with sock:
+            for start in range(0, len(texts), self.max_request_texts):
+                vectors.extend(self._request(sock, texts[start:start + self.max_request_texts]))
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def server_stats(self) -> dict:
+        with self._connect() as sock:
+            _send_frame(sock, {'op': 'stats'})
+            return _recv_frame(sock)
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def _request(self, sock: socket.socket, texts: List[str]) -> List[List[float]]:
+        _send_frame(sock, {'op': 'embed', 'texts': texts})
+        reply = _recv_frame(sock)
+        if 'error' in reply:
+            raise RuntimeError(f"Embedding server error: {reply['error']}")
+
+        rows, dim = reply['rows'], reply['dim']
+        shm = shared_memory.SharedMemory(name=reply['shm'])
+        try:
+            # The server owns the segment; stop our resource tracker from
+            # unlinking it again (or warning about a leak) at exit.
+            resource_tracker.unregister(shm._name, 'shared_memory')
+            flat = array.array('f')
+            flat.frombytes(bytes(shm.buf[:rows * dim * flat.itemsize]))
+        finally:
+            shm.close()
+        sock.sendall(_ACK)
+
+        values = flat.tolist()
+        return [values[i * dim:(i + 1) * dim] for i in range(rows)]
+
+    def _get_fallback(self):
+        if self._fallback is None:
+            with self._fallback_lock:
+                if self._fallback is None:
+                    self._fallback = self._fallback_factory()
+        return self._fallback
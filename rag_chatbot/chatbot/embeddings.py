@@ -0,0 +1,54 @@
+"""Embedding model construction shared by the API views and helper processes."""
+import threading
+
+from django.conf import settings
+
+
+DEFAULT_HF_MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+
+_embeddings = None
+_embeddings_lock = threading.Lock()
+
+
+def build_embeddings(provider: str = None):
+    """Create a new embeddings object for the given (or configured) provider."""
+    provider = provider or getattr(settings, 'RAG_EMBEDDINGS_PROVIDER', 'huggingface')
+    model_name = getattr(settings, 'RAG_HF_MODEL_NAME', DEFAULT_HF_MODEL_NAME)
+
+    if provider == 'server':
+        from .embedding_server import EmbeddingServerClient
+
+        fallback = None
+        if getattr(settings, 'RAG_EMBEDDING_SERVER_FALLBACK', True):
+            backend = getattr(settings, 'RAG_EMBEDDING_SERVER_BACKEND', 'huggingface')
+            fallback = lambda: build_embeddings(backend)  # noqa: E731
+        return EmbeddingServerClient(
+            socket_path=settings.RAG_EMBEDDING_SERVER_SOCKET,
+            timeout=getattr(settings, 'RAG_EMBEDDING_SERVER_TIMEOUT', 30.0),
+            fallback=fallback,
+            max_request_texts=getattr(settings, 'RAG_EMBEDDING_SERVER_MAX_BATCH', 64),
+        )
+
+    if provider == 'onnx':
+        from .onnx_embeddings import OnnxEmbeddings
+
+        return OnnxEmbeddings(
+            model_name=model_name,
+            cache_dir=settings.RAG_ONNX_CACHE_DIR,
+            quantization=getattr(settings, 'RAG_ONNX_QUANTIZATION', ''),
+            intra_op_threads=getattr(settings, 'RAG_ONNX_INTRA_OP_THREADS', 0),
+            batch_size=getattr(settings, 'RAG_ONNX_BATCH_SIZE', 32),
+        )
+
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name=model_name)
+
+
+def get_embeddings():
+    """Return the process-wide embeddings object, loading the model on first use."""
+    global _embeddings
+    if _embeddings is None:
+        with _embeddings_lock:
+            if _embeddings is None:
+                _embeddings = build_embeddings()
+    return _embeddings
@@ -0,0 +1,105 @@
+"""
+Extractive answers built from the retrieved chunks without calling an LLM.
+
+The top-k chunks are split into sentences, every sentence is embedded with the
+already-loaded embedding model (one batched call, cached per sentence) and
+scored against the query vector with a single matrix product. The best
+sentences, with their chunk citations and character offsets, form the answer.
+"""
+import re
+import threading
+from collections import OrderedDict
+from typing import List
+
+import numpy as np
+
+
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+|\n\s*\n')
+_MIN_SENTENCE_CHARS = 20
+
+
+def split_sentences(text: str):
+    """Yield ``(sentence, start, end)`` spans of ``text``."""
+    start = 0
+    for match in _SENTENCE_BOUNDARY.finditer(text):
+        yield from _span(text, start, match.start())
+        start = match.end()
+    yield from _span(text, start, len(text))
+
+
+def _span(text, start, end):
+    sentence = text[start:end].strip()
+    if len(sentence) >= _MIN_SENTENCE_CHARS:
+        offset = text.index(sentence, start)
+        yield sentence, offset, offset + len(sentence)
+
+
+class SentenceVectorCache:
+    """LRU cache of sentence embeddings so repeated chunks are embedded once."""
+
+    def __init__(self, max_size: int = 20000):
+        self.max_size = max_size
+        self._vectors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def vectors(self, embeddings, sentences: List[str]) -> np.ndarray:
+        with self._lock:
+            cached = {s: self._vectors[s] for s in set(sentences) if s in self._vectors}
+            for s in cached:
+                self._vectors.move_to_end(s)
+        missing = [s for s in dict.fromkeys(sentences) if s not in cached]
+        if missing:
+            fresh = dict(zip(missing, np.asarray(embeddings.embed_documents(missing), dtype=np.float32)))
+            cached.update(fresh)
+            with self._lock:
+                self._vectors.update(fresh)
+                while len(self._vectors) > self.max_size:
+                    self._vectors.popitem(last=False)
+        return np.stack([cached[s] for s in sentences])
+
+
+_sentence_cache = SentenceVectorCache()
+
+
+def extractive_answer(query_vector, results: List, embeddings, max_sentences: int = 3) -> dict:
+    """Pick the sentences of ``results`` (``(doc, distance)`` pairs) closest to the query.
+
+    Returns ``answer`` (sentences with ``[n]`` citation markers), ``citations``
+    in the same shape as generated answers, ``highlights`` with character
+    offsets into each result's content, and ``confidence`` (best cosine score).
+    """
+    sentences, spans = [], []
+    for idx, (doc, _) in enumerate(results, start=1):
+        for sentence, start, end in split_sentences(doc.page_content):
+            sentences.append(sentence)
+            spans.append((idx, start, end))
+    if not sentences:
+        return {'answer': "I couldn't find an answer in your documents.", 'citations': [], 'highlights': [], 'confidence': 0.0}
+
+    matrix = _sentence_cache.vectors(embeddings, sentences)
+    query = np.asarray(query_vector, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+    scores = (matrix @ query) / np.clip(norms, 1e-12, None)
+
+    best = np.argsort(-scores)[:max_sentences]
+    # Present the chosen sentences in reading order: by chunk rank, then position
+    chosen = sorted(best.tolist(), key=lambda i: spans[i][:2])
+
+    highlights = [
+        {'index': spans[i][0], 'start': spans[i][1], 'end': spans[i][2], 'score': float(scores[i])}
+        for i in chosen
+    ]
+    answer = ' '.join(f'{sentences[i]} [{spans[i][0]}]' for i in chosen)
+
+    citations = []
+    for idx in sorted({spans[i][0] for i in chosen}):
+        doc, dist = results[idx - 1]
+        metadata = doc.metadata if isinstance(doc.metadata, dict) else {}
+        citations.append({'index': idx, 'source': metadata.get('source'), 'page': metadata.get('page'), 'score': dist})
+
+    return {
+        'answer': answer,
+        'citations': citations,
+        'highlights': highlights,
+        'confidence': float(scores[best[0]]),
+    }
@@ -0,0 +1,10 @@
+"""Helpers shared by the benchmark and check management commands."""
+
+
+def sample_texts(count: int):
+    """``count`` distinct query-like texts for the embedding benchmarks."""
+    topics = ['invoices', 'onboarding', 'security policy', 'release notes', 'incident report', 'API limits']
+    return [
+        f"What does the {topics[i % len(topics)]} document say about item {i} and its follow-up actions?"
+        for i in range(count)
+    ]
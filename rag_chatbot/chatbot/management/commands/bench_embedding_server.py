@@ -0,0 +1,112 @@
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.management.benchmarks import sample_texts
+
+
+def _rss_kb(pid: int):
+    """Current resident set size of ``pid`` in KB (Linux only)."""
+    try:
+        with open(f'/proc/{pid}/status') as fh:
+            for line in fh:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _worker(mode, socket_path, texts, batch_size, barrier, results):
+    import django
+    django.setup()
+
+    from chatbot.embedding_server import EmbeddingServerClient
+    from chatbot.embeddings import build_embeddings
+
+    if mode == 'server':
+        embeddings = EmbeddingServerClient(socket_path=socket_path)
+    else:
+        embeddings = build_embeddings('huggingface')
+    embeddings.embed_query('warm-up')
+
+    barrier.wait()
+    start = time.time()
+    for i in range(0, len(texts), batch_size):
+        embeddings.embed_documents(texts[i:i + batch_size])
+    end = time.time()
+    # ru_maxrss is reported in KB on Linux
+    results.put((start, end, len(texts), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+
+
+class Command(BaseCommand):
+    help = 'Compare worker RSS and embedding throughput for in-process vs shared-server embeddings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8],
+                            help='Worker process counts to benchmark')
+        parser.add_argument('--texts-per-worker', type=int, default=200)
+        parser.add_argument('--batch-size', type=int, default=1,
+                            help='Texts per embed call (1 mimics query-time embedding)')
+        parser.add_argument('--modes', nargs='+', choices=['inprocess', 'server'], default=['inprocess', 'server'])
+
+    def handle(self, *args, **options):
+        texts = sample_texts(options['texts_per_worker'])
+        rows = []
+        for workers in options['workers']:
+            for mode in options['modes']:
+                rows.append(self._run(mode, workers, texts, options['batch_size']))
+
+        self.stdout.write(f"{'mode':<10} {'workers':>7} {'texts/s':>10} {'worker RSS MB':>14} {'server RSS MB':>14} {'total MB':>9}")
+        for mode, workers, throughput, worker_rss, server_rss in rows:
+            total = worker_rss + (server_rss or 0)
+            server_col = f'{server_rss / 1024:.0f}' if server_rss is not None else '-'
+            self.stdout.write(
+                f'{mode:<10} {workers:>7} {throughput:>10.1f} {worker_rss / 1024:>14.0f} {server_col:>14} {total / 1024:>9.0f}'
+            )
+
+    def _run(self, mode, workers, texts, batch_size):
+        ctx = multiprocessing.get_context('spawn')
+        server = None
+        socket_path = os.path.join(tempfile.mkdtemp(prefix='embed-bench-'), 'embeddings.sock')
+        if mode == 'server':
+            server = subprocess.Popen(
+                [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'run_embedding_server',
+                 '--socket', socket_path, '--backend', 'huggingface'],
+                stdout=subprocess.DEVNULL,
+            )
+            deadline = time.time() + 300
+            while not os.path.exists(socket_path):
+                if server.poll() is not None or time.time() > deadline:
+                    raise CommandError('Embedding server failed to start')
+                time.sleep(0.2)
+
+        try:
+            barrier = ctx.Barrier(workers)
+            results = ctx.Queue()
+            procs = [
+                ctx.Process(target=_worker, args=(mode, socket_path, texts, batch_size, barrier, results))
+                for _ in range(workers)
+            ]
+            for p in procs:
+                p.start()
+            reports = [results.get() for _ in procs]
+            for p in procs:
+                p.join()
+            server_rss = _rss_kb(server.pid) if server else None
+        finally:
+            if server:
+                server.terminate()
+                server.wait()
+
+        elapsed = max(r[1] for r in reports) - min(r[0] for r in reports)
+        throughput = sum(r[2] for r in reports) / elapsed if elapsed > 0 else 0.0
+        worker_rss = sum(r[3] for r in reports)
+        return mode, workers, throughput, worker_rss, server_rss
@@ -0,0 +1,89 @@
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+
+DIM = 384  # all-MiniLM-L6-v2
+
+
+def _vector(rng):
+    return [rng.uniform(-1.0, 1.0) for _ in range(DIM)]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark filtered retrieval latency against corpus size on a synthetic Chroma collection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000],
+                            help='Number of chunks in the synthetic corpus')
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--docs-per-user', type=int, default=20)
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--top-k', type=int, default=4)
+
+    def handle(self, *args, **options):
+        import chromadb
+
+        rng = random.Random(42)
+        self.stdout.write(f"{'chunks':>8} {'filter':<22} {'mean ms':>8} {'p95 ms':>8} {'avg hits':>9}")
+        for size in options['sizes']:
+            path = tempfile.mkdtemp(prefix='filtered-bench-')
+            try:
+                client = chromadb.PersistentClient(path=path)
+                collection = client.create_collection('documents', metadata={'hnsw:space': 'l2'})
+                self._populate(collection, size, options, rng)
+                for label, where in self._filters(options, rng):
+                    self._measure(collection, size, label, where, options, rng)
+            finally:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _populate(self, collection, size, options, rng):
+        batch = 5000
+        for start in range(0, size, batch):
+            ids, embeddings, metadatas = [], [], []
+            for i in range(start, min(size, start + batch)):
+                user = i % options['users']
+                doc = user * options['docs_per_user'] + rng.randrange(options['docs_per_user'])
+                ids.append(f'chunk-{i}')
+                embeddings.append(_vector(rng))
+                # Compact integer-keyed metadata, as written by the upload view (chatbot.chunkstore)
+                metadatas.append({'u': user, 'd': doc, 'p': rng.randrange(50), 't': i})
+            collection.add(ids=ids, embeddings=embeddings, metadatas=metadatas)
+
+    def _filters(self, options, rng):
+        user = 7
+        first_doc = 7 * options['docs_per_user']
+        # A source filter is resolved to the matching documents in the database first
+        source_docs = [d for d in range(first_doc, first_doc + options['docs_per_user']) if d % 5 == 2]
+        return [
+            ('user only', {'u': {'$eq': user}}),
+            ('user + source', {'$and': [{'u': {'$eq': user}}, {'d': {'$in': source_docs}}]}),
+            ('user + 2 documents', {'$and': [
+                {'u': {'$eq': user}},
+                {'d': {'$in': [first_doc, first_doc + 1]}},
+            ]}),
+            ('user + doc + pages', {'$and': [
+                {'u': {'$eq': user}},
+                {'d': {'$in': [first_doc]}},
+                {'p': {'$gte': 10}},
+                {'p': {'$lte': 20}},
+            ]}),
+        ]
+
+    def _measure(self, collection, size, label, where, options, rng):
+        timings, hits = [], []
+        for _ in range(options['queries']):
+            query = _vector(rng)
+            start = time.perf_counter()
+            result = collection.query(query_embeddings=[query], n_results=options['top_k'], where=where)
+            timings.append((time.perf_counter() - start) * 1000)
+            hits.append(len(result['ids'][0]))
+        timings.sort()
+        self.stdout.write(
+            f'{size:>8} {label:<22} {statistics.mean(timings):>8.2f} '
+            f'{timings[int(len(timings) * 0.95)]:>8.2f} {statistics.mean(hits):>9.2f}'
+        )
@@ -0,0 +1,45 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.chunkstore import USER_KEY, hydrate
+
+
+class Command(BaseCommand):
+    help = 'Measure the query-time cost of hydrating compact chunk metadata from the chunk store'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--top-k', type=int, default=4)
+
+    def handle(self, *args, **options):
+        from chatbot.views import _get_vectorstore
+
+        collection = _get_vectorstore()._collection
+        # Stored chunk vectors stand in for query vectors, scoped to their own user like real queries
+        sample = collection.get(limit=options['queries'], include=['metadatas', 'embeddings'])
+        if not sample['ids']:
+            raise CommandError('The vector store is empty')
+
+        search, hydration = [], []
+        for metadata, vector in zip(sample['metadatas'], sample['embeddings']):
+            start = time.perf_counter()
+            result = collection.query(
+                query_embeddings=[list(vector)], n_results=options['top_k'],
+                where={USER_KEY: {'$eq': metadata.get(USER_KEY, -1)}}, include=['metadatas', 'distances'],
+            )
+            searched = time.perf_counter()
+            hydrate(result['metadatas'][0])
+            search.append((searched - start) * 1000)
+            hydration.append((time.perf_counter() - searched) * 1000)
+
+        for label, timings in (('vector search', search), ('hydration', hydration)):
+            timings.sort()
+            self.stdout.write(
+                f'{label:<14} mean {statistics.mean(timings):7.2f} ms   '
+                f'p95 {timings[int(len(timings) * 0.95)]:7.2f} ms'
+            )
+        self.stdout.write(
+            f'hydration adds {100 * statistics.mean(hydration) / statistics.mean(search):.1f}% to retrieval'
+        )
@@ -0,0 +1,112 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+
+IMPORT_SNIPPET = (
+    "import os, time; t = time.perf_counter(); "
+    "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rag_chatbot.settings'); "
+    "import django; django.setup(); import chatbot.views, chatbot.urls; "
+    "print(time.perf_counter() - t)"
+)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _request(url, data=None, token=None, timeout=300):
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    body = json.dumps(data).encode() if data is not None else None
+    req = urllib.request.Request(url, data=body, headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+class Command(BaseCommand):
+    help = 'Measure import time and time-to-first-response of a fresh server, with and without warm-up'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--server', choices=['runserver', 'asgi'], default='runserver',
+                            help="'asgi' boots rag_chatbot.asgi under uvicorn")
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement (median is reported)')
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        imports = self._median([self._import_time() for _ in range(repeat)])
+        self.stdout.write(f'django.setup() + chatbot.views import: {imports * 1000:.0f} ms')
+
+        user = get_user_model().objects.create_user(username=f'bench-{uuid.uuid4().hex[:12]}')
+        try:
+            from rest_framework_simplejwt.tokens import AccessToken
+            token = str(AccessToken.for_user(user))
+
+            self.stdout.write(f"{'warm-up':<8} {'first response':>15} {'first query':>12} {'boot to query':>14}")
+            for warm in (False, True):
+                runs = [self._boot(options['server'], warm, token) for _ in range(repeat)]
+                first_response, first_query = (self._median([r[i] for r in runs]) for i in range(2))
+                self.stdout.write(
+                    f"{'on' if warm else 'off':<8} {first_response * 1000:>12.0f} ms {first_query * 1000:>9.0f} ms "
+                    f"{(first_response + first_query) * 1000:>11.0f} ms"
+                )
+        finally:
+            user.delete()
+
+    @staticmethod
+    def _median(values):
+        values = sorted(values)
+        return values[len(values) // 2]
+
+    def _import_time(self) -> float:
+        out = subprocess.check_output([sys.executable, '-c', IMPORT_SNIPPET], cwd=settings.BASE_DIR)
+        return float(out.decode().strip().splitlines()[-1])
+
+    def _boot(self, server, warm, token):
+        """Return (seconds until the first HTTP response, seconds for the first query)."""
+        port = _free_port()
+        if server == 'asgi':
+            cmd = [sys.executable, '-m', 'uvicorn', 'rag_chatbot.asgi:application', '--port', str(port)]
+        else:
+            cmd = [sys.executable, 'manage.py', 'runserver', '--noreload', f'127.0.0.1:{port}']
+        env = {**os.environ, 'RAG_WARMUP_ON_STARTUP': 'true' if warm else 'false'}
+        base = f'http://127.0.0.1:{port}/api'
+
+        start = time.perf_counter()
+        proc = subprocess.Popen(cmd, cwd=settings.BASE_DIR, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            while True:
+                if proc.poll() is not None:
+                    raise CommandError(f'{server} exited before serving requests')
+                try:
+                    _request(f'{base}/auth/me/', timeout=5)
+                    break
+                except (urllib.error.URLError, ConnectionError):
+                    time.sleep(0.05)
+            first_response = time.perf_counter() - start
+
+            query_start = time.perf_counter()
+            status = _request(f'{base}/query/', {'query': 'warm-up benchmark', 'generate': False}, token)
+            if status != 200:
+                raise CommandError(f'First query failed with HTTP {status}')
+            return first_response, time.perf_counter() - query_start
+        finally:
+            proc.terminate()
+            proc.wait()
@@ -0,0 +1,80 @@
+import math
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.embeddings import build_embeddings
+from chatbot.management.benchmarks import sample_texts
+from chatbot.onnx_embeddings import OnnxEmbeddings
+
+
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def _norm(v):
+    return math.sqrt(sum(x * x for x in v))
+
+
+def _throughput(embeddings, texts, batch_size):
+    embeddings.embed_documents(texts[:batch_size])  # warm-up
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        embeddings.embed_documents(texts[i:i + batch_size])
+    return len(texts) / (time.perf_counter() - start)
+
+
+class Command(BaseCommand):
+    help = 'Validate ONNX embeddings against the PyTorch model and compare their throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--texts', type=int, default=256, help='Number of sample texts')
+        parser.add_argument('--batch-size', type=int, default=32)
+        parser.add_argument('--quantization', default=settings.RAG_ONNX_QUANTIZATION,
+                            help="Quantization preset to validate ('' for full precision)")
+        parser.add_argument('--threads', type=int, default=settings.RAG_ONNX_INTRA_OP_THREADS,
+                            help='ONNX Runtime intra-op threads (0 = runtime default)')
+        parser.add_argument('--min-cosine', type=float, default=0.99,
+                            help='Fail if any embedding is less similar than this to the PyTorch one')
+        parser.add_argument('--max-norm-diff', type=float, default=0.01,
+                            help='Fail if any embedding length differs from the PyTorch one by more than '
+                                 'this fraction (catches normalization mismatches cosine cannot see)')
+
+    def handle(self, *args, **options):
+        texts = sample_texts(options['texts'])
+        batch_size = options['batch_size']
+
+        reference = build_embeddings('huggingface')
+        onnx = OnnxEmbeddings(
+            model_name=settings.RAG_HF_MODEL_NAME,
+            cache_dir=settings.RAG_ONNX_CACHE_DIR,
+            quantization=options['quantization'],
+            intra_op_threads=options['threads'],
+            batch_size=batch_size,
+        )
+
+        expected = reference.embed_documents(texts)
+        actual = onnx.embed_documents(texts)
+        similarities = [_cosine(a, b) for a, b in zip(expected, actual)]
+        worst = min(similarities)
+        mean = sum(similarities) / len(similarities)
+        norm_diff = max(abs(_norm(b) - _norm(a)) / max(_norm(a), 1e-12) for a, b in zip(expected, actual))
+        label = f"onnx ({options['quantization'] or 'fp32'})"
+
+        self.stdout.write(f'Cosine similarity vs PyTorch: min={worst:.5f} mean={mean:.5f}')
+        self.stdout.write(f'Vector length vs PyTorch: max relative difference={norm_diff:.5f} '
+                          f'(normalize={onnx.normalize})')
+        self.stdout.write(f'{"pytorch":<22} {_throughput(reference, texts, batch_size):>10.1f} texts/s')
+        self.stdout.write(f'{label:<22} {_throughput(onnx, texts, batch_size):>10.1f} texts/s')
+
+        if worst < options['min_cosine']:
+            raise CommandError(f"ONNX embeddings diverge from PyTorch: min cosine {worst:.5f} < {options['min_cosine']}")
+        if norm_diff > options['max_norm_diff']:
+            raise CommandError(
+                f"ONNX and PyTorch vector lengths differ by up to {norm_diff:.5f} (> {options['max_norm_diff']}); "
+                "their distances would not be comparable in one collection"
+            )
+        self.stdout.write(self.style.SUCCESS('ONNX embeddings are within tolerance'))
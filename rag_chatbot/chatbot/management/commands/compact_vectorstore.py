@@ -0,0 +1,157 @@
+import json
+import os
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import Length
+
+from chatbot.chunkstore import TEXT_KEY, compact_metadata, reconcile_ref_counts, store_texts
+from chatbot.models import ChunkText, Document
+from chatbot.snapshots import vectorstore_lock
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def _mb(size: int) -> str:
+    return f'{size / (1024 * 1024):.1f} MB'
+
+
+def _write_journal(path: str, records: list):
+    tmp_path = f'{path}.partial'
+    with open(tmp_path, 'w') as fh:
+        json.dump(records, fh)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp_path, path)
+
+
+class Command(BaseCommand):
+    help = (
+        'Move chunk text out of the Chroma collection into the deduplicated chunk store and '
+        'rewrite chunk metadata to compact integer keys. Run once after upgrading (after migrate); '
+        'safe to re-run, and an interrupted run is recovered from its journal. Web workers should be stopped '
+        'or idle while it runs.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--vacuum', action='store_true',
+                            help="VACUUM Chroma's SQLite database afterwards to return the freed space to disk")
+
+    def handle(self, *args, **options):
+        import chromadb
+
+        persist_dir = getattr(settings, 'CHROMA_PERSIST_DIR', os.path.join(settings.BASE_DIR, 'chroma'))
+        if not os.path.isdir(persist_dir):
+            raise CommandError(f'No vector store at {persist_dir}')
+        size_before = _dir_size(persist_dir)
+
+        # Legacy entries of the batch being rewritten, kept on disk until the rewrite has committed
+        journal = f'{os.path.abspath(persist_dir)}.compact-journal.json'
+        with vectorstore_lock(exclusive=True):
+            collection = chromadb.PersistentClient(path=persist_dir).get_or_create_collection('documents')
+            if os.path.exists(journal):
+                self.stdout.write('Recovering the batch of an interrupted run')
+                self._recover(collection, journal)
+
+            all_ids = collection.get(include=[])['ids']
+            migrated = skipped = 0
+            for start in range(0, len(all_ids), options['batch_size']):
+                done, orphaned = self._compact_batch(collection, all_ids[start:start + options['batch_size']], journal)
+                migrated += done
+                skipped += orphaned
+            # Makes counts exact even if an earlier run died between a batch's add and its commit
+            reconcile_ref_counts(collection)
+
+            if options['vacuum']:
+                with sqlite3.connect(os.path.join(persist_dir, 'chroma.sqlite3')) as db:
+                    db.execute('VACUUM')
+
+        size_after = _dir_size(persist_dir)
+        texts = ChunkText.objects.aggregate(bytes=Sum(Length('text')), refs=Sum('ref_count'))
+        self.stdout.write(
+            f'Migrated {migrated} of {len(all_ids)} chunks'
+            + (f' ({skipped} without a Document row left untouched)' if skipped else '')
+        )
+        self.stdout.write(f'Vector store: {_mb(size_before)} -> {_mb(size_after)}')
+        self.stdout.write(
+            f"Chunk store: {ChunkText.objects.count()} distinct texts for {texts['refs'] or 0} chunks, "
+            f"{_mb(texts['bytes'] or 0)} of text"
+        )
+        if not options['vacuum'] and size_after >= size_before and migrated:
+            self.stdout.write('Run again with --vacuum to release the space freed inside the SQLite file.')
+
+    def _recover(self, collection, journal):
+        """Put the journaled batch back in its legacy form; the normal run then redoes it."""
+        with open(journal) as fh:
+            records = json.load(fh)
+        ids = [record['id'] for record in records]
+        collection.delete(ids=ids)
+        collection.add(
+            ids=ids,
+            embeddings=[record['embedding'] for record in records],
+            metadatas=[record['metadata'] for record in records],
+            documents=[record['text'] for record in records],
+        )
+        os.remove(journal)
+
+    def _compact_batch(self, collection, ids, journal):
+        result = collection.get(ids=ids, include=['documents', 'metadatas', 'embeddings'])
+        legacy = []
+        for chunk_id, text, metadata, embedding in zip(
+            result['ids'], result['documents'], result['metadatas'], result['embeddings']
+        ):
+            metadata = metadata or {}
+            if TEXT_KEY in metadata:
+                continue  # already compact
+            try:
+                document_id = int(metadata['document_id'])
+            except (KeyError, TypeError, ValueError):
+                document_id = None
+            legacy.append((chunk_id, text or '', metadata, embedding, document_id))
+
+        documents = Document.objects.in_bulk({entry[4] for entry in legacy if entry[4] is not None})
+        legacy_known = [entry for entry in legacy if entry[4] in documents]
+        if not legacy_known:
+            return 0, len(legacy)
+
+        # Citations used the chunk's 'source' metadata; it now lives on the document
+        for _, _, metadata, _, document_id in legacy_known:
+            document = documents[document_id]
+            if not document.source and metadata.get('source'):
+                document.source = metadata['source'][:255]
+                document.save(update_fields=['source'])
+
+        chunk_ids = [entry[0] for entry in legacy_known]
+        _write_journal(journal, [
+            {'id': chunk_id, 'text': text, 'metadata': metadata, 'embedding': [float(x) for x in embedding]}
+            for chunk_id, text, metadata, embedding, _ in legacy_known
+        ])
+        # References only commit once the compact entries are in place
+        with transaction.atomic():
+            text_ids = store_texts([entry[1] for entry in legacy_known])
+            # Same ids, so chunk ids recorded in conversation turns stay valid
+            collection.delete(ids=chunk_ids)
+            try:
+                collection.add(
+                    ids=chunk_ids,
+                    embeddings=[list(entry[3]) for entry in legacy_known],
+                    metadatas=[
+                        compact_metadata(documents[document_id].user_id, document_id, text_id, metadata.get('page'))
+                        for (_, _, metadata, _, document_id), text_id in zip(legacy_known, text_ids)
+                    ],
+                )
+            except Exception:
+                self._recover(collection, journal)
+                raise
+        os.remove(journal)
+        return len(legacy_known), len(legacy) - len(legacy_known)
@@ -0,0 +1,43 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.embedding_server import EmbeddingServer
+from chatbot.embeddings import build_embeddings
+
+
+class Command(BaseCommand):
+    help = 'Run the shared embedding server that web workers use when RAG_EMBEDDINGS_PROVIDER=server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=settings.RAG_EMBEDDING_SERVER_SOCKET,
+                            help='Unix socket path to listen on')
+        parser.add_argument('--backend', default=settings.RAG_EMBEDDING_SERVER_BACKEND,
+                            help='Embeddings provider the server loads in-process')
+        parser.add_argument('--batch-window-ms', type=float, default=settings.RAG_EMBEDDING_SERVER_BATCH_WINDOW_MS,
+                            help='How long to wait for more requests before running a batch')
+        parser.add_argument('--max-batch-size', type=int, default=settings.RAG_EMBEDDING_SERVER_MAX_BATCH,
+                            help='Maximum number of texts embedded in one batch')
+
+    def handle(self, *args, **options):
+        if options['backend'] == 'server':
+            raise CommandError('The embedding server cannot use the "server" provider as its own backend.')
+
+        embeddings = build_embeddings(options['backend'])
+        # Load the weights before accepting connections
+        embeddings.embed_query('warm-up')
+
+        server = EmbeddingServer(
+            embeddings,
+            socket_path=options['socket'],
+            batch_window=options['batch_window_ms'] / 1000.0,
+            max_batch_size=options['max_batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Embedding server ({options['backend']}) listening on {options['socket']}"
+        ))
+        try:
+            asyncio.run(server.serve_forever())
+        except KeyboardInterrupt:
+            self.stdout.write('Embedding server stopped')
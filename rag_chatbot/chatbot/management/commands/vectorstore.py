@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from chatbot.snapshots import create_snapshot, restore_snapshot
+from chatbot.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        'Snapshot, restore or preload the Chroma vector store. Run restore before starting '
+        'the web workers that use the target directory.'
+    )
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='action', required=True)
+
+        snapshot = subparsers.add_parser('snapshot', help='Write a consistent snapshot archive')
+        snapshot.add_argument('output', help='Path of the .tar (or .tar.gz with --compress) to write')
+        snapshot.add_argument('--compress', action='store_true', help='gzip the archive (slower restore)')
+
+        restore = subparsers.add_parser('restore', help='Restore a snapshot archive')
+        restore.add_argument('archive')
+        restore.add_argument('--target', help='Directory to restore into (defaults to CHROMA_PERSIST_DIR)')
+        restore.add_argument('--skip-documents', action='store_true',
+                             help='Only restore vectors and chunk texts, not Document rows')
+        restore.add_argument('--replace-db', action='store_true',
+                             help='Discard local documents and chunk texts the snapshot does not contain')
+
+        subparsers.add_parser('preload', help='Page the index into memory and run a warm-up query')
+
+    def handle(self, *args, **options):
+        action = options['action']
+        try:
+            if action == 'snapshot':
+                manifest = create_snapshot(options['output'], compress=options['compress'])
+                self.stdout.write(self.style.SUCCESS(
+                    f"Snapshot written to {options['output']} "
+                    f"({len(manifest['files'])} files, {manifest['documents']} documents)"
+                ))
+            elif action == 'restore':
+                manifest = restore_snapshot(
+                    options['archive'], target_dir=options['target'],
+                    load_documents=not options['skip_documents'], replace_db=options['replace_db'],
+                )
+                self.stdout.write(self.style.SUCCESS(
+                    f"Restored snapshot from {manifest['created_at']} ({manifest['documents']} documents)"
+                ))
+                if not manifest['database_restored']:
+                    self.stdout.write(
+                        'The target is not CHROMA_PERSIST_DIR, so only the directory was restored; '
+                        'the database rows were left unchanged.'
+                    )
+            else:
+                elapsed = warm_up()
+                self.stdout.write(self.style.SUCCESS(f'Vector store preloaded in {elapsed:.2f}s'))
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
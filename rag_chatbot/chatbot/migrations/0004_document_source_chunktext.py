@@ -0,0 +1,25 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0003_conversation_conversationturn'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='source',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.CreateModel(
+            name='ChunkText',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('text', models.TextField()),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
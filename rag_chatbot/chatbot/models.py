@@ -12,6 +12,7 @@ class Document(models.Model):
     file_size = models.BigIntegerField()  # File size in bytes
     file_type = models.CharField(max_length=100)  # MIME type or file extension
     chroma_collection_id = models.CharField(max_length=255, blank=True, null=True)  # Chroma collection identifier
+    source = models.CharField(max_length=255, blank=True)  # Source label shown in citations
     upload_date = models.DateTimeField(auto_now_add=True)
     last_modified = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)  # Soft delete flag
@@ -20,6 +21,10 @@ class Document(models.Model):
         ordering = ['-upload_date']
         verbose_name = 'Document'
         verbose_name_plural = 'Documents'
+        indexes = [
+            # Keyset pagination of a user's active documents (documents/ endpoint)
+            models.Index(fields=['user', 'is_active', 'upload_date'], name='chatbot_doc_user_active_date'),
+        ]
     
     def __str__(self):
         return f"{self.title} ({self.user.username})"
@@ -33,3 +38,43 @@ class Document(models.Model):
                 return f"{size:.1f} {unit}"
             size /= 1024.0
         return f"{size:.1f} TB"
+
+
+class Conversation(models.Model):
+    """A chat session whose turns can reuse each other's retrieved context"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversations')
+    title = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-updated_at']
+
+    def __str__(self):
+        return f"{self.title or 'Conversation'} ({self.user.username})"
+
+
+class ConversationTurn(models.Model):
+    """One question/answer exchange and the vector store chunks it used"""
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='turns')
+    query = models.TextField()
+    answer = models.TextField(blank=True)
+    chunk_ids = models.JSONField(default=list)  # Chroma ids of the context blocks, best first
+    reused_chunks = models.PositiveIntegerField(default=0)  # taken from earlier turns
+    retrieved_chunks = models.PositiveIntegerField(default=0)  # newly found by vector search
+    prompt_tokens = models.PositiveIntegerField(default=0)  # estimated size of the LLM prompt
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+
+class ChunkText(models.Model):
+    """Content-addressed chunk text; vector store entries reference it by id"""
+    digest = models.CharField(max_length=64, unique=True)  # sha256 of the text
+    text = models.TextField()
+    ref_count = models.PositiveIntegerField(default=0)  # vector store entries using this text
+
+    def __str__(self):
+        return self.digest[:12]
+
@@ -0,0 +1,202 @@
+"""
+ONNX Runtime embeddings for CPU-only hosts.
+
+The configured Hugging Face model is exported to ONNX once (optionally with
+dynamic int8 quantization) and cached on disk; afterwards only ``onnxruntime``
+and the tokenizer are needed at runtime. Output matches sentence-transformers:
+attention-masked mean pooling over at most the model's ``max_seq_length``
+tokens (from ``sentence_bert_config.json``), followed by L2 normalization when
+the model's ``modules.json`` includes a ``Normalize`` module (as
+``HuggingFaceEmbeddings`` does), so both providers write comparable vectors into
+one collection.
+
+Requires the optional packages ``optimum[onnxruntime]`` (for the one-off
+export) and ``onnxruntime``.
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+QUANTIZATION_PRESETS = ('avx2', 'avx512', 'avx512_vnni', 'arm64')
+
+
+MODULES_FILE = 'modules.json'
+SENTENCE_BERT_CONFIG_FILE = 'sentence_bert_config.json'
+# Token limit for models without a sentence_bert_config.json
+DEFAULT_MAX_SEQ_LENGTH = 256
+
+
+def _model_cache_dir(cache_root: str, model_name: str) -> str:
+    return os.path.join(cache_root, model_name.replace('/', '__'))
+
+
+def _onnx_file_name(quantization: str) -> str:
+    # One file per preset, so switching presets never reuses another preset's model
+    return f'model_quantized_{quantization}.onnx' if quantization else 'model.onnx'
+
+
+def _fetch_config_file(model_name: str, target_dir: str, file_name: str):
+    """Copy the sentence-transformers config ``file_name`` of ``model_name`` (if it has one) into ``target_dir``."""
+    if os.path.isdir(model_name):
+        source = os.path.join(model_name, file_name)
+    else:
+        try:
+            from huggingface_hub import hf_hub_download
+
+            source = hf_hub_download(model_name, file_name)
+        except Exception:
+            return  # plain transformers model: sentence-transformers uses its defaults
+    if os.path.exists(source):
+        shutil.copyfile(source, os.path.join(target_dir, file_name))
+
+
+def _read_config(model_dir: str, file_name: str):
+    try:
+        with open(os.path.join(model_dir, file_name)) as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return None
+
+
+def uses_normalize(model_dir: str) -> bool:
+    """Whether the exported model's sentence-transformers pipeline ends in L2 normalization."""
+    modules = _read_config(model_dir, MODULES_FILE) or []
+    return any(module.get('type', '').endswith('.Normalize') for module in modules)
+
+
+def max_seq_length(model_dir: str) -> int:
+    """Token limit sentence-transformers truncates the exported model's input to."""
+    config = _read_config(model_dir, SENTENCE_BERT_CONFIG_FILE) or {}
+    return config.get('max_seq_length') or DEFAULT_MAX_SEQ_LENGTH
+
+
+def export_model(model_name: str, cache_root: str, quantization: str = '') -> str:
+    """Export ``model_name`` to ONNX under ``cache_root`` and return the .onnx path.
+
+    Existing exports are reused. The export is written to a temporary directory
+    and moved into place, so concurrent workers never see a half-written model.
+    """
+    if quantization and quantization not in QUANTIZATION_PRESETS:
+        raise ValueError(f"Unknown ONNX quantization preset {quantization!r}; expected one of {QUANTIZATION_PRESETS}")
+
+    model_dir = _model_cache_dir(cache_root, model_name)
+    file_name = _onnx_file_name(quantization)
+    if os.path.exists(os.path.join(model_dir, file_name)):
+        for config_file in (MODULES_FILE, SENTENCE_BERT_CONFIG_FILE):
+            if not os.path.exists(os.path.join(model_dir, config_file)):
+                _fetch_config_file(model_name, model_dir, config_file)  # exports made before they were cached
+        return os.path.join(model_dir, file_name)
+
+    try:
+        from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        from transformers import AutoTokenizer
+    except ImportError as exc:
+        raise ImportError(
+            "Exporting the embedding model to ONNX requires optimum. "
+            "Install it with `pip install optimum[onnxruntime]`."
+        ) from exc
+
+    os.makedirs(cache_root, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix='export-', dir=cache_root)
+    try:
+        if os.path.exists(os.path.join(model_dir, 'model.onnx')):
+            shutil.copytree(model_dir, tmp_dir, dirs_exist_ok=True)
+        else:
+            ORTModelForFeatureExtraction.from_pretrained(model_name, export=True).save_pretrained(tmp_dir)
+            AutoTokenizer.from_pretrained(model_name).save_pretrained(tmp_dir)
+            for config_file in (MODULES_FILE, SENTENCE_BERT_CONFIG_FILE):
+                _fetch_config_file(model_name, tmp_dir, config_file)
+
+        if quantization:
+            preset = getattr(AutoQuantizationConfig, quantization)
+            quantizer = ORTQuantizer.from_pretrained(tmp_dir, file_name='model.onnx')
+            quantizer.quantize(
+                save_dir=tmp_dir,
+                quantization_config=preset(is_static=False, per_channel=False),
+                file_suffix=f'quantized_{quantization}',
+            )
+
+        if os.path.exists(model_dir):
+            # Another worker finished first, or we are adding a quantized variant
+            for name in os.listdir(tmp_dir):
+                os.replace(os.path.join(tmp_dir, name), os.path.join(model_dir, name))
+        else:
+            os.replace(tmp_dir, model_dir)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return os.path.join(model_dir, file_name)
+
+
+class OnnxEmbeddings(Embeddings):
+    """LangChain ``Embeddings`` running an exported model on ONNX Runtime."""
+
+    def __init__(
+        self,
+        model_name: str,
+        cache_dir: str,
+        quantization: str = '',
+        intra_op_threads: int = 0,
+        batch_size: int = 32,
+        max_length: int = None,
+        normalize: bool = None,
+    ):
+        try:
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+        except ImportError as exc:
+            raise ImportError(
+                "The 'onnx' embeddings provider requires onnxruntime. "
+                "Install it with `pip install optimum[onnxruntime]`."
+            ) from exc
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+
+        model_path = export_model(model_name, cache_dir, quantization)
+        model_dir = os.path.dirname(model_path)
+        # None: follow the model's sentence-transformers config, like HuggingFaceEmbeddings
+        self.max_length = max_seq_length(model_dir) if max_length is None else max_length
+        self.normalize = uses_normalize(model_dir) if normalize is None else normalize
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # 0 lets ONNX Runtime pick one thread per physical core
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = 1
+        self._session = ort.InferenceSession(model_path, sess_options=options, providers=['CPUExecutionProvider'])
+        self._input_names = {i.name for i in self._session.get_inputs()}
+        self._tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        # Fast tokenizers are not safe to call from several threads at once
+        self._tokenizer_lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        vectors = [self._embed_batch(texts[i:i + self.batch_size]) for i in range(0, len(texts), self.batch_size)]
+        return np.concatenate(vectors).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0].tolist()
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        with self._tokenizer_lock:
+            encoded = self._tokenizer(
+                list(texts), padding=True, truncation=True, max_length=self.max_length, return_tensors='np'
+            )
+        inputs = {name: encoded[name].astype(np.int64) for name in self._input_names if name in encoded}
+        if 'token_type_ids' in self._input_names and 'token_type_ids' not in inputs:
+            inputs['token_type_ids'] = np.zeros_like(inputs['input_ids'])
+        hidden = self._session.run(None, inputs)[0]
+
+        mask = encoded['attention_mask'][..., None].astype(hidden.dtype)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
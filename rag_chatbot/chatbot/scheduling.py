@@ -0,0 +1,275 @@
+"""
+Admission control for LLM generation.
+
+Every ``QueryView`` request with ``generate=True`` used to call the chat model
+straight away, so traffic spikes turned into provider rate limits for everyone.
+:class:`GenerationScheduler` caps concurrent generations globally and per user,
+keeps a bounded priority queue of waiting requests (interactive before batch)
+and rejects requests it cannot admit in time so the view can fall back to a
+retrieval-only response.
+
+The in-process queue only orders the requests of one worker. With
+``RAG_GEN_SLOT_DIR`` set, the request at its head must also take a
+:class:`HostSlots` slot, so the global and per-user caps hold across every
+worker process on the host.
+"""
+import bisect
+import itertools
+import os
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+
+PRIORITIES = {'interactive': 0, 'batch': 1}
+
+
+class GenerationRejected(Exception):
+    """Raised when a generation request is shed instead of admitted."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class _Ticket:
+    __slots__ = ('key', 'user_id', 'priority', 'shed')
+
+    def __init__(self, key, user_id, priority):
+        self.key = key
+        self.user_id = user_id
+        self.priority = priority
+        self.shed = False
+
+    def __lt__(self, other):
+        return self.key < other.key
+
+
+class HostSlots:
+    """Generation slots shared by every process on the host.
+
+    A slot is a file in ``directory`` held with an exclusive ``flock`` while
+    the generation runs; the kernel drops the lock if the worker dies, so
+    slots never leak. There are ``max_concurrency`` global slot files and
+    ``max_per_user`` per user.
+    """
+
+    def __init__(self, directory: str, max_concurrency: int, max_per_user: int):
+        if fcntl is None:  # pragma: no cover
+            raise RuntimeError('Host-wide generation slots need fcntl (not available on this platform)')
+        self.directory = directory
+        self.max_concurrency = max_concurrency
+        self.max_per_user = max_per_user
+        os.makedirs(directory, exist_ok=True)
+
+    def try_acquire(self, user_id):
+        """Take a per-user and a global slot without blocking.
+
+        Returns ``(lease, None)``, or ``(None, 'user')`` / ``(None, 'global')``
+        naming the cap that is full.
+        """
+        user_slot = self._try_lock(f'user-{user_id}', self.max_per_user)
+        if user_slot is None:
+            return None, 'user'
+        global_slot = self._try_lock('global', self.max_concurrency)
+        if global_slot is None:
+            user_slot.close()
+            return None, 'global'
+        return (user_slot, global_slot), None
+
+    def release(self, lease):
+        for fh in lease:
+            fh.close()  # closing the file drops its lock
+
+    def _try_lock(self, prefix: str, count: int):
+        for i in range(count):
+            fh = open(os.path.join(self.directory, f'{prefix}.{i}'), 'a')
+            try:
+                fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                fh.close()
+                continue
+            return fh
+        return None
+
+
+class GenerationScheduler:
+    # Slots freed by other processes don't wake our waiters, so the head of the queue polls for them
+    host_poll_interval = 0.05
+
+    def __init__(
+        self, max_concurrency: int = 4, max_per_user: int = 2, max_queue: int = 32, queue_timeout: float = 10.0,
+        host_slots: HostSlots = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_per_user = max_per_user
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.host_slots = host_slots
+
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._waiting = []  # tickets sorted by (priority, arrival)
+        self._active = 0
+        self._active_by_user = Counter()
+        self._host_leases = defaultdict(list)
+        # Users whose host-wide cap is full; skipped so they don't hold up other users until the next poll
+        self._host_busy_users = set()
+
+        self._admitted = Counter()
+        self._rejected = Counter()
+        self._wait_count = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._recent_waits = deque(maxlen=1000)
+
+    @contextmanager
+    def slot(self, user_id, priority: str = 'interactive', timeout: float = None):
+        """Hold a generation slot for the duration of the ``with`` block."""
+        self.acquire(user_id, priority, timeout)
+        try:
+            yield
+        finally:
+            self.release(user_id)
+
+    def acquire(self, user_id, priority: str = 'interactive', timeout: float = None) -> float:
+        """Block until a slot is free and return the time spent waiting.
+
+        Raises :class:`GenerationRejected` if the queue is full or the wait
+        exceeds ``timeout`` (``queue_timeout`` by default).
+        """
+        timeout = self.queue_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        ticket = _Ticket((PRIORITIES[priority], next(self._seq)), user_id, priority)
+
+        with self._cond:
+            self._enqueue(ticket)
+            while True:
+                if ticket.shed:
+                    self._rejected['preempted'] += 1
+                    raise GenerationRejected('preempted')
+                if self._active < self.max_concurrency and self._next_eligible() is ticket:
+                    if self.host_slots is None:
+                        break
+                    lease, full = self.host_slots.try_acquire(user_id)
+                    if lease is not None:
+                        self._host_leases[user_id].append(lease)
+                        break
+                    if full == 'user':
+                        self._host_busy_users.add(user_id)
+                        self._cond.notify_all()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiting.remove(ticket)
+                    self._rejected['timeout'] += 1
+                    # Our departure may unblock a waiter that was behind us
+                    self._cond.notify_all()
+                    raise GenerationRejected('timeout')
+                if self.host_slots is None:
+                    self._cond.wait(remaining)
+                elif not self._cond.wait(min(remaining, self.host_poll_interval)):
+                    self._host_busy_users.clear()
+
+            self._waiting.remove(ticket)
+            self._active += 1
+            self._active_by_user[user_id] += 1
+            # A waiter that slept while we were next in line may be eligible now
+            self._cond.notify_all()
+            self._admitted[priority] += 1
+            waited = time.monotonic() - start
+            self._record_wait(waited)
+            return waited
+
+    def release(self, user_id):
+        with self._cond:
+            self._active -= 1
+            self._active_by_user[user_id] -= 1
+            if self._active_by_user[user_id] <= 0:
+                del self._active_by_user[user_id]
+            if self._host_leases.get(user_id):
+                self.host_slots.release(self._host_leases[user_id].pop())
+                if not self._host_leases[user_id]:
+                    del self._host_leases[user_id]
+                self._host_busy_users.discard(user_id)
+            self._cond.notify_all()
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            recent = sorted(self._recent_waits)
+            depth = Counter(t.priority for t in self._waiting)
+            return {
+                'active': self._active,
+                'max_concurrency': self.max_concurrency,
+                'host_wide': self.host_slots is not None,
+                'queue_depth': len(self._waiting),
+                'queue_depth_by_priority': {p: depth.get(p, 0) for p in PRIORITIES},
+                'max_queue': self.max_queue,
+                'admitted': {p: self._admitted.get(p, 0) for p in PRIORITIES},
+                'rejected': dict(self._rejected),
+                'wait_seconds': {
+                    'count': self._wait_count,
+                    'mean': self._wait_total / self._wait_count if self._wait_count else 0.0,
+                    'max': self._wait_max,
+                    'p50': recent[len(recent) // 2] if recent else 0.0,
+                    'p95': recent[int(len(recent) * 0.95)] if recent else 0.0,
+                },
+            }
+
+    def _enqueue(self, ticket):
+        if len(self._waiting) >= self.max_queue:
+            lowest = self._waiting[-1] if self._waiting else None
+            if lowest is None or lowest.key[0] <= ticket.key[0]:
+                self._rejected['queue_full'] += 1
+                raise GenerationRejected('queue_full')
+            # Make room by shedding the newest request of a lower priority class
+            self._waiting.pop()
+            lowest.shed = True
+        bisect.insort(self._waiting, ticket)
+        self._cond.notify_all()
+
+    def _next_eligible(self):
+        for ticket in self._waiting:
+            if self._active_by_user[ticket.user_id] < self.max_per_user and ticket.user_id not in self._host_busy_users:
+                return ticket
+        return None
+
+    def _record_wait(self, waited):
+        self._wait_count += 1
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+        self._recent_waits.append(waited)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_generation_scheduler() -> GenerationScheduler:
+    """Return the process-wide scheduler configured from settings.
+
+    The caps are host-wide when ``RAG_GEN_SLOT_DIR`` is set, per process otherwise.
+    """
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                max_concurrency = getattr(settings, 'RAG_GEN_MAX_CONCURRENCY', 4)
+                max_per_user = getattr(settings, 'RAG_GEN_MAX_PER_USER', 2)
+                slot_dir = getattr(settings, 'RAG_GEN_SLOT_DIR', '')
+                _scheduler = GenerationScheduler(
+                    max_concurrency=max_concurrency,
+                    max_per_user=max_per_user,
+                    max_queue=getattr(settings, 'RAG_GEN_MAX_QUEUE', 32),
+                    queue_timeout=getattr(settings, 'RAG_GEN_QUEUE_TIMEOUT', 10.0),
+                    host_slots=HostSlots(slot_dir, max_concurrency, max_per_user) if slot_dir else None,
+                )
+    return _scheduler
@@ -2,6 +2,8 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from rest_framework import serializers
 
+from .models import Conversation, ConversationTurn
+
 
 User = get_user_model()
 
@@ -60,8 +62,51 @@ class DocumentUploadSerializer(serializers.Serializer):
 class QuerySerializer(serializers.Serializer):
     query = serializers.CharField()
     top_k = serializers.IntegerField(required=False, min_value=1, default=4)
-    # Optional simple metadata filter
+    # Optional metadata filters, pushed down into the vector store query
     source = serializers.CharField(required=False, allow_blank=True)
+    document_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False, allow_empty=False
+    )
+    page_from = serializers.IntegerField(required=False, min_value=0)
+    page_to = serializers.IntegerField(required=False, min_value=0)
+    uploaded_after = serializers.DateTimeField(required=False)
+    uploaded_before = serializers.DateTimeField(required=False)
     generate = serializers.BooleanField(required=False, default=True)
     temperature = serializers.FloatField(required=False, min_value=0.0, max_value=2.0, default=0.7)
+    # Interactive requests are admitted to generation ahead of batch ones
+    priority = serializers.ChoiceField(choices=['interactive', 'batch'], required=False, default='interactive')
+    # 'llm' generates with the chat model, 'extractive' answers with the best-matching sentences
+    # without an LLM call, 'auto' only calls the LLM when the extractive answer is not confident
+    answer_mode = serializers.ChoiceField(choices=['llm', 'extractive', 'auto'], required=False, default='llm')
+    # Follow-up questions in a conversation reuse context retrieved by earlier turns
+    conversation_id = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, attrs):
+        if 'page_from' in attrs and 'page_to' in attrs and attrs['page_from'] > attrs['page_to']:
+            raise serializers.ValidationError({'page_to': 'Must be greater than or equal to page_from.'})
+        if (
+            'uploaded_after' in attrs and 'uploaded_before' in attrs
+            and attrs['uploaded_after'] > attrs['uploaded_before']
+        ):
+            raise serializers.ValidationError({'uploaded_before': 'Must be later than uploaded_after.'})
+        return attrs
+
+
+class ConversationTurnSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ConversationTurn
+        fields = ['id', 'query', 'answer', 'reused_chunks', 'retrieved_chunks', 'prompt_tokens', 'created_at']
+
+
+class ConversationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Conversation
+        fields = ['id', 'title', 'created_at', 'updated_at']
+        read_only_fields = ['created_at', 'updated_at']
+
+
+class ConversationDetailSerializer(ConversationSerializer):
+    turns = ConversationTurnSerializer(many=True, read_only=True)
 
+    class Meta(ConversationSerializer.Meta):
+        fields = ConversationSerializer.Meta.fields + ['turns']
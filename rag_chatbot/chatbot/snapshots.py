@@ -0,0 +1,260 @@
+"""
+Consistent snapshots of the Chroma persist directory, ``Document`` and
+``ChunkText`` rows.
+
+A snapshot is a tar archive containing the persist directory, JSON dumps of
+the ``Document`` and ``ChunkText`` tables (the vector store only references
+chunk texts by id) and a ``manifest.json`` with per-file checksums.
+Snapshots are taken under an exclusive lock that the API's vector store
+writers (uploads and deletes, together with their ``Document`` and
+``ChunkText`` writes) hold in shared mode, and SQLite files are copied with
+the online backup API, so the archive never contains a half-applied write.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tarfile
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import serializers
+from django.db import DatabaseError, transaction
+
+from .models import ChunkText, Document
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+
+SNAPSHOT_FORMAT = 1
+
+
+def _persist_dir() -> str:
+    return getattr(settings, 'CHROMA_PERSIST_DIR', os.path.join(settings.BASE_DIR, 'chroma'))
+
+
+@contextmanager
+def vectorstore_lock(exclusive: bool = False, persist_dir: str = None):
+    """Hold the vector store lock; writers take it shared, snapshots exclusive.
+
+    The lock file lives next to (not inside) the persist directory so a restore
+    can swap the directory without touching the lock.
+    """
+    persist_dir = persist_dir or _persist_dir()
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(persist_dir)), exist_ok=True)
+    with open(f'{os.path.abspath(persist_dir)}.lock', 'a') as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _copy_persist_dir(src: str, dst: str):
+    for root, _, files in os.walk(src):
+        rel = os.path.relpath(root, src)
+        os.makedirs(os.path.join(dst, rel), exist_ok=True)
+        for name in files:
+            if name.endswith(('-wal', '-shm', '-journal')):
+                continue  # folded into the main database by the backup API
+            source = os.path.join(root, name)
+            target = os.path.join(dst, rel, name)
+            if name.endswith('.sqlite3'):
+                with sqlite3.connect(source) as src_db, sqlite3.connect(target) as dst_db:
+                    src_db.backup(dst_db)
+            else:
+                shutil.copy2(source, target)
+
+
+def create_snapshot(output_path: str, compress: bool = False) -> dict:
+    """Write a snapshot archive to ``output_path`` and return its manifest."""
+    persist_dir = _persist_dir()
+    staging = tempfile.mkdtemp(prefix='snapshot-')
+    try:
+        chroma_dir = os.path.join(staging, 'chroma')
+        with vectorstore_lock(exclusive=True):
+            if os.path.isdir(persist_dir):
+                _copy_persist_dir(persist_dir, chroma_dir)
+            else:
+                os.makedirs(chroma_dir)
+            with open(os.path.join(staging, 'documents.json'), 'w') as fh:
+                serializers.serialize('json', Document.objects.order_by('id'), stream=fh)
+            with open(os.path.join(staging, 'chunk_texts.json'), 'w') as fh:
+                serializers.serialize('json', ChunkText.objects.order_by('id'), stream=fh)
+
+        files = {}
+        for root, _, names in os.walk(staging):
+            for name in names:
+                path = os.path.join(root, name)
+                files[os.path.relpath(path, staging)] = _sha256(path)
+        manifest = {
+            'format': SNAPSHOT_FORMAT,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'embedding_model': getattr(settings, 'RAG_HF_MODEL_NAME', None),
+            'documents': Document.objects.count(),
+            'files': files,
+        }
+        with open(os.path.join(staging, 'manifest.json'), 'w') as fh:
+            json.dump(manifest, fh, indent=2)
+
+        tmp_output = f'{output_path}.partial'
+        with tarfile.open(tmp_output, 'w:gz' if compress else 'w') as tar:
+            for name in sorted(os.listdir(staging)):
+                tar.add(os.path.join(staging, name), arcname=name)
+        os.replace(tmp_output, output_path)
+        return manifest
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def restore_snapshot(
+    archive_path: str, target_dir: str = None, load_documents: bool = True, replace_db: bool = False
+) -> dict:
+    """Restore a snapshot into ``target_dir`` (the configured persist dir by default).
+
+    The database rows (chunk texts and, unless ``load_documents`` is False,
+    documents) are only loaded when the target is the configured persist dir:
+    they describe that directory, and a restore elsewhere must not change what
+    the live store's references point at. Loading them refuses to drop local
+    documents or chunk texts the snapshot doesn't contain unless ``replace_db``
+    is set; local documents missing from the snapshot are then deactivated.
+
+    Checksums and the users that restored documents belong to are verified
+    before anything is replaced. The previous directory is kept as
+    ``<target>.bak-<timestamp>`` until the swap and the row import have both
+    succeeded, and put back if either fails. The returned manifest's
+    ``database_restored`` says whether rows were loaded.
+    """
+    target_dir = os.path.abspath(target_dir or _persist_dir())
+    restore_rows = target_dir == os.path.abspath(_persist_dir())
+    parent = os.path.dirname(target_dir)
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='restore-', dir=parent)
+    try:
+        with tarfile.open(archive_path) as tar:
+            tar.extractall(staging, filter='data')
+        with open(os.path.join(staging, 'manifest.json')) as fh:
+            manifest = json.load(fh)
+        if manifest.get('format') != SNAPSHOT_FORMAT:
+            raise ValueError(f"Unsupported snapshot format {manifest.get('format')!r}")
+        for rel, checksum in manifest['files'].items():
+            if _sha256(os.path.join(staging, rel)) != checksum:
+                raise ValueError(f'Checksum mismatch for {rel}; snapshot is corrupt')
+
+        # Chunk texts belong to the vector store (it only references them by id), so they are
+        # restored with it; snapshots taken before chunk texts moved out of Chroma have none.
+        rows = []
+        documents = []
+        if restore_rows:
+            rows = _read_rows(staging, 'chunk_texts.json')
+            documents = _read_rows(staging, 'documents.json')
+            if load_documents:
+                user_ids = {obj.object.user_id for obj in documents}
+                missing = user_ids - set(
+                    get_user_model().objects.filter(id__in=user_ids).values_list('id', flat=True)
+                )
+                if missing:
+                    raise ValueError(
+                        f'Snapshot documents belong to users that do not exist here (ids {sorted(missing)}); '
+                        'create them first or restore with --skip-documents'
+                    )
+
+        # Rows and directory are swapped as one step: a failure in either leaves both as they were
+        with vectorstore_lock(exclusive=True, persist_dir=target_dir):
+            if restore_rows and not replace_db:
+                _check_local_rows(documents, rows)
+            backup = None
+            swapped = False
+            try:
+                with transaction.atomic():
+                    if restore_rows:
+                        # The old chunk texts describe the directory being replaced
+                        ChunkText.objects.all().delete()
+                        # Their chunks are gone with the old directory
+                        Document.objects.exclude(id__in=[obj.object.id for obj in documents]).update(
+                            is_active=False
+                        )
+                        for obj in (documents if load_documents else []) + rows:
+                            obj.save()
+                    if os.path.exists(target_dir):
+                        backup = f'{target_dir}.bak-{int(time.time())}'
+                        os.replace(target_dir, backup)
+                    os.replace(os.path.join(staging, 'chroma'), target_dir)
+                    swapped = True
+            except Exception as e:
+                if swapped:
+                    shutil.rmtree(target_dir, ignore_errors=True)
+                if backup:
+                    os.replace(backup, target_dir)
+                if isinstance(e, DatabaseError):
+                    raise ValueError(f'Could not load the snapshot rows: {e}') from e
+                raise
+            if backup:
+                shutil.rmtree(backup, ignore_errors=True)
+        return {**manifest, 'database_restored': restore_rows}
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def _check_local_rows(documents: list, chunk_texts: list):
+    """Refuse a restore that would drop or overwrite local rows the snapshot doesn't contain."""
+    snapshot_documents = {obj.object.id: (obj.object.user_id, obj.object.file_path) for obj in documents}
+    # Active documents would lose their chunks; any row sharing an id with a different snapshot document
+    # would be overwritten
+    foreign_documents = [
+        doc_id for doc_id, user_id, file_path, is_active in Document.objects.values_list(
+            'id', 'user_id', 'file_path', 'is_active'
+        )
+        if snapshot_documents.get(doc_id, (None, None)) != (user_id, file_path)
+        and (is_active or doc_id in snapshot_documents)
+    ]
+    snapshot_texts = {(obj.object.id, obj.object.digest) for obj in chunk_texts}
+    foreign_texts = sum(
+        1 for row in ChunkText.objects.values_list('id', 'digest').iterator() if row not in snapshot_texts
+    )
+    if foreign_documents or foreign_texts:
+        raise ValueError(
+            f'The database holds {len(foreign_documents)} documents and {foreign_texts} chunk texts '
+            'that are not in the snapshot; restore with --replace-db to discard them'
+        )
+
+
+def _read_rows(staging: str, name: str) -> list:
+    path = os.path.join(staging, name)
+    if not os.path.exists(path):
+        return []
+    with open(path) as fh:
+        return list(serializers.deserialize('json', fh))
+
+
+def page_in_persist_dir(persist_dir: str = None) -> int:
+    """Read every file of the persist directory so the HNSW index and SQLite
+    pages are in the OS page cache. Returns the number of bytes read."""
+    persist_dir = persist_dir or _persist_dir()
+    total = 0
+    for root, _, names in os.walk(persist_dir):
+        for name in names:
+            with open(os.path.join(root, name), 'rb') as fh:
+                if hasattr(os, 'posix_fadvise'):
+                    os.posix_fadvise(fh.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+                for block in iter(lambda: fh.read(1024 * 1024), b''):
+                    total += len(block)
+    return total
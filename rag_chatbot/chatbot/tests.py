@@ -1,3 +1,884 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .chunkstore import (
+    compact_metadata, delete_document_chunks, hydrate, reconcile_ref_counts, release_texts, store_texts,
+)
+from .coalescing import SingleFlight, coalescing_key
+from .conversations import build_history, estimate_tokens, merge_results, recent_chunk_ids
+from .embedding_server import EmbeddingServer, EmbeddingServerClient
+from .extractive import extractive_answer, split_sentences
+from .models import ChunkText, Conversation, ConversationTurn, Document
+from .onnx_embeddings import (
+    DEFAULT_MAX_SEQ_LENGTH, _model_cache_dir, _onnx_file_name, export_model, max_seq_length, uses_normalize,
+)
+from .scheduling import GenerationRejected, GenerationScheduler, HostSlots
+from .serializers import QuerySerializer
+from .snapshots import create_snapshot, restore_snapshot
+from .views import QueryView, _build_where_filter
+
+
+User = get_user_model()
+
+
+def _create_documents(user, count, **extra):
+    return [
+        Document.objects.create(
+            user=user,
+            title=f'doc {i}',
+            filename=f'doc{i}.txt',
+            file_path=f'/tmp/doc{i}.txt',
+            file_size=1024 * i,
+            file_type='text/plain',
+            **extra,
+        )
+        for i in range(count)
+    ]
+
+
+class UserDocumentsPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('user_documents')
+
+    def _fetch_all(self, **params):
+        ids, cursor = [], None
+        while True:
+            query = dict(params, **({'cursor': cursor} if cursor else {}))
+            response = self.client.get(self.url, query)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(doc['id'] for doc in response.data['documents'])
+            cursor = response.data['next_cursor']
+            if cursor is None:
+                return ids
+
+    def test_pages_cover_all_active_documents_in_order(self):
+        docs = _create_documents(self.user, 7)
+        # Equal timestamps must still paginate without gaps or duplicates
+        same_time = timezone.now() - timedelta(days=1)
+        Document.objects.filter(id__in=[d.id for d in docs[:4]]).update(upload_date=same_time)
+        Document.objects.filter(id=docs[-1].id).update(is_active=False)
+        _create_documents(User.objects.create_user(username='bob'), 3)
+
+        expected = list(
+            Document.objects.filter(user=self.user, is_active=True)
+            .order_by('-upload_date', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(self._fetch_all(limit=2), expected)
+
+    def test_field_selection(self):
+        _create_documents(self.user, 2)
+        response = self.client.get(self.url, {'fields': 'id,title,file_size_human'})
+        self.assertEqual(set(response.data['documents'][0]), {'id', 'title', 'file_size_human'})
+
+        response = self.client.get(self.url, {'fields': 'id,file_path'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_query_count_does_not_grow_with_documents(self):
+        _create_documents(self.user, 3)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(self.url, {'limit': 50})
+        _create_documents(self.user, 30)
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(self.url, {'limit': 50})
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(len(large), 1)
+
+
+class UserAdminDocumentCountTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username='admin', password='pw', email='admin@example.com')
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:auth_user_changelist')
+
+    def test_changelist_query_count_does_not_grow_with_users(self):
+        _create_documents(User.objects.create_user(username='u0'), 2)
+        self.client.get(self.url)  # populate per-process caches (content types, ...)
+        with CaptureQueriesContext(connection) as few:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+
+        for i in range(1, 8):
+            _create_documents(User.objects.create_user(username=f'u{i}'), i)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(few), len(many))
+
+    def test_counts_only_active_documents(self):
+        user = User.objects.create_user(username='carol')
+        docs = _create_documents(user, 3)
+        Document.objects.filter(id=docs[0].id).update(is_active=False)
+        response = self.client.get(self.url)
+        self.assertContains(response, '2 documents')
+
+
+class _Chunk:
+    def __init__(self, chunk_id):
+        self.id = chunk_id
+
+
+class ConversationContextTests(SimpleTestCase):
+    def test_recent_chunk_ids_prefers_latest_turns(self):
+        turns = [ConversationTurn(chunk_ids=ids) for ids in (['a', 'b'], ['c'], ['b', 'd'])]
+        self.assertEqual(recent_chunk_ids(turns, limit=2), ['b', 'd', 'c'])
+
+    def test_merge_results_dedupes_and_keeps_closest(self):
+        reused = [(_Chunk('a'), 0.3), (_Chunk('b'), 0.5)]
+        searched = [(_Chunk('a'), 0.3), (_Chunk('c'), 0.1), (_Chunk('d'), 0.9)]
+        merged = merge_results(reused, searched, top_k=3)
+        self.assertEqual([doc.id for doc, _ in merged], ['c', 'a', 'b'])
+
+    def test_history_fits_budget_and_keeps_newest_turns(self):
+        turns = [ConversationTurn(query=f'question {i}', answer='answer ' * 40) for i in range(5)]
+        history = build_history(turns, token_budget=120)
+        self.assertLessEqual(estimate_tokens(history), 120)
+        # Only the newest turn fits verbatim; older ones are reduced to their question
+        self.assertEqual(history.count('Assistant:'), 1)
+        self.assertIn('answer', history.split('User: question 4')[1])
+        self.assertIn('question 0', history)
+
+        history = build_history(turns, token_budget=80)
+        self.assertIn('question 4', history)
+        self.assertNotIn('question 3', history)
+
+
+class ConversationViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='dana', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_create_list_and_detail(self):
+        response = self.client.post(reverse('conversations'), {'title': 'Onboarding'})
+        self.assertEqual(response.status_code, 201)
+        conversation = Conversation.objects.get(id=response.data['id'])
+        ConversationTurn.objects.create(conversation=conversation, query='q', answer='a', chunk_ids=['x'])
+
+        response = self.client.get(reverse('conversations'))
+        self.assertEqual([c['title'] for c in response.data], ['Onboarding'])
+
+        response = self.client.get(reverse('conversation_detail', args=[conversation.id]))
+        self.assertEqual(len(response.data['turns']), 1)
+
+    def test_other_users_conversations_are_hidden(self):
+        other = Conversation.objects.create(user=User.objects.create_user(username='eve'))
+        response = self.client.get(reverse('conversation_detail', args=[other.id]))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.post(reverse('rag_query'), {'query': 'hi', 'conversation_id': other.id}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+
+
+class ChunkStoreTests(TestCase):
+    def test_identical_texts_are_stored_once_and_reference_counted(self):
+        first = store_texts(['alpha', 'beta', 'alpha'])
+        second = store_texts(['beta'])
+        self.assertEqual(first[0], first[2])
+        self.assertEqual(second[0], first[1])
+        self.assertEqual(ChunkText.objects.count(), 2)
+        self.assertEqual(ChunkText.objects.get(id=first[0]).ref_count, 2)
+
+        release_texts(first)
+        self.assertEqual(list(ChunkText.objects.values_list('text', 'ref_count')), [('beta', 1)])
+        release_texts(second)
+        self.assertFalse(ChunkText.objects.exists())
+
+    def test_failed_vector_store_write_rolls_references_back(self):
+        store_texts(['kept'])
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            store_texts(['kept', 'new'])
+            raise RuntimeError('collection.add failed')
+        self.assertEqual(list(ChunkText.objects.values_list('text', 'ref_count')), [('kept', 1)])
+
+    def test_reconcile_recounts_from_vector_store(self):
+        a, b, _ = store_texts(['a', 'b', 'c'])
+        store_texts(['a', 'a'])  # references whose vector store write never happened
+
+        class Collection:
+            def get(self, include, limit, offset):
+                metadatas = [{'t': a}, {'t': b}, {'t': b}][offset:offset + limit]
+                return {'ids': [str(i) for i in range(len(metadatas))], 'metadatas': metadatas}
+
+        self.assertEqual(reconcile_ref_counts(Collection(), page_size=2), 1)
+        self.assertEqual(dict(ChunkText.objects.values_list('id', 'ref_count')), {a: 1, b: 2})
+
+    def test_hydrate_restores_public_metadata(self):
+        user = User.objects.create_user(username='frank')
+        doc, = _create_documents(user, 1, source='handbook')
+        text_id, = store_texts(['Chunk body.'])
+        (text, metadata), = hydrate([compact_metadata(user.id, doc.id, text_id, page=3)])
+        self.assertEqual(text, 'Chunk body.')
+        self.assertEqual(metadata, {'source': 'handbook', 'page': 3, 'user_id': str(user.id), 'document_id': str(doc.id)})
+
+    def test_source_filter_is_resolved_to_documents(self):
+        user = User.objects.create_user(username='grace')
+        handbook, _ = _create_documents(user, 2, source='handbook')
+        Document.objects.exclude(id=handbook.id).update(source='notes')
+        where = _build_where_filter([user.id], {'source': 'handbook'})
+        self.assertEqual(where, {'$and': [{'u': {'$eq': user.id}}, {'d': {'$in': [handbook.id]}}]})
+        self.assertIsNone(_build_where_filter([user.id], {'source': 'missing'}))
+
+    def _collection(self, entries, fail=False):
+        class Collection:
+            def get(self, where, include):
+                document_id = where['d']['$eq']
+                ids = [chunk_id for chunk_id, m in entries.items() if m['d'] == document_id]
+                return {'ids': ids, 'metadatas': [entries[chunk_id] for chunk_id in ids]}
+
+            def delete(self, ids):
+                if fail:
+                    raise RuntimeError('chroma is read-only')
+                for chunk_id in ids:
+                    del entries[chunk_id]
+
+        return SimpleNamespace(_collection=Collection())
+
+    def test_deleting_a_document_removes_its_chunks_and_texts(self):
+        user = User.objects.create_user(username='ivan')
+        doc, other = _create_documents(user, 2)
+        shared, own = store_texts(['shared', 'own'])
+        store_texts(['shared'])
+        entries = {
+            '1': compact_metadata(user.id, doc.id, shared), '2': compact_metadata(user.id, doc.id, own),
+            '3': compact_metadata(user.id, other.id, shared),
+        }
+        with mock.patch('chatbot.views._get_vectorstore', return_value=self._collection(entries)):
+            self.assertEqual(delete_document_chunks(doc.id), 2)
+        self.assertEqual(list(entries), ['3'])
+        self.assertEqual(list(ChunkText.objects.values_list('text', 'ref_count')), [('shared', 1)])
+
+    def test_failed_chunk_delete_keeps_the_document(self):
+        user = User.objects.create_user(username='judy')
+        doc, = _create_documents(user, 1)
+        text_id, = store_texts(['body'])
+        entries = {'1': compact_metadata(user.id, doc.id, text_id)}
+        client = APIClient()
+        client.force_authenticate(user)
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        with override_settings(CHROMA_PERSIST_DIR=os.path.join(tmp, 'chroma')), \
+                mock.patch('chatbot.views._get_vectorstore', return_value=self._collection(entries, fail=True)):
+            response = client.delete(reverse('delete_document', args=[doc.id]))
+        self.assertEqual(response.status_code, 500)
+        doc.refresh_from_db()
+        self.assertTrue(doc.is_active)
+        self.assertEqual(ChunkText.objects.get(id=text_id).ref_count, 1)
+
+
+class QueryFilterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='kate')
+        self.other = User.objects.create_user(username='leo')
+        self.mine, self.deleted = _create_documents(self.user, 2)
+        self.deleted.is_active = False
+        self.deleted.save()
+        self.foreign, = _create_documents(self.other, 1)
+
+    def test_document_ids_drop_foreign_and_inactive_documents(self):
+        ids = [self.mine.id, self.deleted.id, self.foreign.id]
+        self.assertEqual(
+            _build_where_filter([self.user.id], {'document_ids': ids}),
+            {'$and': [{'u': {'$eq': self.user.id}}, {'d': {'$in': [self.mine.id]}}]},
+        )
+        self.assertIsNone(_build_where_filter([self.user.id], {'document_ids': [self.deleted.id, self.foreign.id]}))
+
+    def test_page_range(self):
+        self.assertEqual(
+            _build_where_filter([self.user.id], {'page_from': 2, 'page_to': 5}),
+            {'$and': [{'u': {'$eq': self.user.id}}, {'p': {'$gte': 2}}, {'p': {'$lte': 5}}]},
+        )
+        self.assertEqual(
+            _build_where_filter([self.user.id], {'page_to': 5}),
+            {'$and': [{'u': {'$eq': self.user.id}}, {'p': {'$lte': 5}}]},
+        )
+
+    def test_upload_dates_are_resolved_to_documents(self):
+        now = timezone.now()
+        older, = _create_documents(self.user, 1)
+        Document.objects.filter(id=older.id).update(upload_date=now - timedelta(days=10))
+        Document.objects.filter(id=self.mine.id).update(upload_date=now - timedelta(days=1))
+
+        where = _build_where_filter([self.user.id], {'uploaded_after': now - timedelta(days=2)})
+        self.assertEqual(where, {'$and': [{'u': {'$eq': self.user.id}}, {'d': {'$in': [self.mine.id]}}]})
+        where = _build_where_filter(
+            [self.user.id], {'uploaded_after': now - timedelta(days=20), 'uploaded_before': now - timedelta(days=5)}
+        )
+        self.assertEqual(where, {'$and': [{'u': {'$eq': self.user.id}}, {'d': {'$in': [older.id]}}]})
+        self.assertIsNone(_build_where_filter([self.user.id], {'uploaded_before': now - timedelta(days=30)}))
+
+    def test_multi_user_scope(self):
+        scope = [self.user.id, self.other.id]
+        self.assertEqual(_build_where_filter(scope, {}), {'u': {'$in': scope}})
+        where = _build_where_filter(scope, {'document_ids': [self.mine.id, self.foreign.id]})
+        self.assertEqual(where['$and'][0], {'u': {'$in': scope}})
+        self.assertCountEqual(where['$and'][1]['d']['$in'], [self.mine.id, self.foreign.id])
+
+    def test_serializer_rejects_inverted_ranges(self):
+        serializer = QuerySerializer(data={'query': 'q', 'page_from': 5, 'page_to': 2})
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('page_to', serializer.errors)
+
+        serializer = QuerySerializer(data={
+            'query': 'q', 'uploaded_after': '2025-02-01T00:00:00Z', 'uploaded_before': '2025-01-01T00:00:00Z',
+        })
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('uploaded_before', serializer.errors)
+
+        serializer = QuerySerializer(data={'query': 'q', 'page_from': 2, 'page_to': 2})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+
+class GenerationSchedulerTests(SimpleTestCase):
+    def _wait_for_queue(self, scheduler, depth):
+        deadline = time.monotonic() + 2
+        while scheduler.snapshot()['queue_depth'] != depth:
+            self.assertLess(time.monotonic(), deadline, 'waiter never queued')
+            time.sleep(0.005)
+
+    def _acquire_in_thread(self, scheduler, user_id, priority, outcomes):
+        def run():
+            try:
+                outcomes[user_id] = scheduler.acquire(user_id, priority)
+            except GenerationRejected as e:
+                outcomes[user_id] = e.reason
+        thread = threading.Thread(target=run)
+        thread.start()
+        return thread
+
+    def test_every_freed_slot_is_used(self):
+        scheduler = GenerationScheduler(max_concurrency=2, queue_timeout=3.0)
+        scheduler.acquire('a')
+        scheduler.acquire('b')
+        outcomes = {}
+        threads = [self._acquire_in_thread(scheduler, 'batch', 'batch', outcomes)]
+        self._wait_for_queue(scheduler, 1)
+        threads.append(self._acquire_in_thread(scheduler, 'interactive', 'interactive', outcomes))
+        self._wait_for_queue(scheduler, 2)
+
+        scheduler.release('a')
+        scheduler.release('b')
+        for thread in threads:
+            thread.join()
+        # Both waiters are admitted promptly instead of one sleeping until queue_timeout
+        self.assertLess(outcomes['batch'], 1.0)
+        self.assertLess(outcomes['interactive'], 1.0)
+        self.assertEqual(scheduler.snapshot()['active'], 2)
+
+    def test_per_user_cap_does_not_block_other_users(self):
+        scheduler = GenerationScheduler(max_concurrency=4, max_per_user=1, queue_timeout=2.0)
+        scheduler.acquire(1)
+        with self.assertRaises(GenerationRejected) as ctx:
+            scheduler.acquire(1, timeout=0.05)
+        self.assertEqual(ctx.exception.reason, 'timeout')
+
+        outcomes = {}
+        thread = self._acquire_in_thread(scheduler, 1, 'interactive', outcomes)
+        self._wait_for_queue(scheduler, 1)
+        # User 2 skips past user 1's capped waiter
+        self.assertLess(scheduler.acquire(2, timeout=0.5), 0.5)
+        scheduler.release(1)
+        thread.join()
+        self.assertIsInstance(outcomes[1], float)
+
+    def test_full_queue_sheds_batch_for_interactive(self):
+        scheduler = GenerationScheduler(max_concurrency=1, max_queue=1, queue_timeout=2.0)
+        scheduler.acquire('holder')
+        outcomes = {}
+        batch = self._acquire_in_thread(scheduler, 'batch', 'batch', outcomes)
+        self._wait_for_queue(scheduler, 1)
+        interactive = self._acquire_in_thread(scheduler, 'interactive', 'interactive', outcomes)
+        batch.join()
+        self.assertEqual(outcomes['batch'], 'preempted')
+
+        self._wait_for_queue(scheduler, 1)
+        with self.assertRaises(GenerationRejected) as ctx:
+            scheduler.acquire('late', 'batch')
+        self.assertEqual(ctx.exception.reason, 'queue_full')
+
+        scheduler.release('holder')
+        interactive.join()
+        self.assertIsInstance(outcomes['interactive'], float)
+        self.assertEqual(scheduler.snapshot()['rejected'], {'preempted': 1, 'queue_full': 1})
+
+    def _worker_schedulers(self, max_concurrency, max_per_user):
+        # Two schedulers sharing a slot directory stand in for two worker processes
+        slot_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, slot_dir, ignore_errors=True)
+        return [
+            GenerationScheduler(
+                max_concurrency=max_concurrency, max_per_user=max_per_user, queue_timeout=2.0,
+                host_slots=HostSlots(slot_dir, max_concurrency, max_per_user),
+            )
+            for _ in range(2)
+        ]
+
+    def test_host_slots_cap_generations_across_workers(self):
+        first, second = self._worker_schedulers(max_concurrency=1, max_per_user=1)
+        first.acquire('a')
+        with self.assertRaises(GenerationRejected) as ctx:
+            second.acquire('b', timeout=0.2)
+        self.assertEqual(ctx.exception.reason, 'timeout')
+
+        outcomes = {}
+        thread = self._acquire_in_thread(second, 'b', 'interactive', outcomes)
+        self._wait_for_queue(second, 1)
+        first.release('a')
+        thread.join()
+        # Picked up by polling, since the other worker can't wake our waiters
+        self.assertLess(outcomes['b'], 1.0)
+        with self.assertRaises(GenerationRejected):
+            first.acquire('a', timeout=0.1)
+        second.release('b')
+        first.acquire('a', timeout=0.5)
+
+    def test_host_per_user_cap_does_not_block_other_users(self):
+        first, second = self._worker_schedulers(max_concurrency=4, max_per_user=1)
+        first.acquire(1)
+        outcomes = {}
+        thread = self._acquire_in_thread(second, 1, 'interactive', outcomes)
+        self._wait_for_queue(second, 1)
+        # User 1 is at its cap in the other worker, so user 2 is admitted past its waiter
+        self.assertLess(second.acquire(2, timeout=0.5), 0.5)
+        first.release(1)
+        thread.join()
+        self.assertIsInstance(outcomes[1], float)
+        self.assertEqual(second.snapshot()['active'], 2)
+
+
+class SingleFlightTests(SimpleTestCase):
+    def _wait_for_coalesced(self, flight, count):
+        deadline = time.monotonic() + 2
+        while flight.stats()['coalesced'] < count:
+            self.assertLess(time.monotonic(), deadline, 'followers never joined')
+            time.sleep(0.005)
+
+    def _run_in_threads(self, count, target):
+        threads = [threading.Thread(target=target) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        calls = []
+        release = threading.Event()
+        results = []
+
+        def fn():
+            calls.append(1)
+            release.wait(2)
+            return 'answer'
+
+        threads = self._run_in_threads(5, lambda: results.append(flight.do('key', fn)))
+        self._wait_for_coalesced(flight, 4)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [('answer', False)] + [('answer', True)] * 4)
+        self.assertEqual(flight.stats(), {'leaders': 1, 'coalesced': 4, 'in_flight': 0})
+
+    def test_leader_exception_reaches_every_waiter_and_frees_the_key(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        errors = []
+
+        def fn():
+            release.wait(2)
+            raise ValueError('provider down')
+
+        def call():
+            try:
+                flight.do('key', fn)
+            except ValueError as e:
+                errors.append(str(e))
+
+        threads = self._run_in_threads(3, call)
+        self._wait_for_coalesced(flight, 2)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, ['provider down'] * 3)
+        self.assertEqual(flight.do('key', lambda: 'retried'), ('retried', False))
+
+    def test_do_async_coalesces_tasks_and_threads(self):
+        flight = SingleFlight()
+        calls = []
+        thread_result = []
+
+        async def leader():
+            calls.append(1)
+            # Hold the call open until the thread waiter has joined
+            while flight.stats()['coalesced'] < 2:
+                await asyncio.sleep(0.005)
+            return 'answer'
+
+        async def main():
+            first = asyncio.ensure_future(flight.do_async('key', leader))
+            second = asyncio.ensure_future(flight.do_async('key', leader))
+            await asyncio.sleep(0)  # let the tasks join before the thread does
+            thread = threading.Thread(target=lambda: thread_result.append(flight.do('key', lambda: 'thread')))
+            thread.start()
+            results = await asyncio.gather(first, second)
+            await asyncio.get_running_loop().run_in_executor(None, thread.join)
+            return results
+
+        results = asyncio.run(main())
+        self.assertEqual(calls, [1])
+        self.assertEqual(results, [('answer', False), ('answer', True)])
+        self.assertEqual(thread_result, [('answer', True)])
+        self.assertEqual(flight.stats(), {'leaders': 1, 'coalesced': 2, 'in_flight': 0})
+
+    def test_sequential_calls_are_not_coalesced(self):
+        flight = SingleFlight()
+        self.assertEqual(flight.do('key', lambda: 1), (1, False))
+        self.assertEqual(flight.do('key', lambda: 2), (2, False))
+        self.assertEqual(flight.stats(), {'leaders': 2, 'coalesced': 0, 'in_flight': 0})
+
+    def test_coalescing_key(self):
+        params = {'top_k': 4, 'generate': True, 'conversation_id': None}
+        key = coalescing_key([1, 2], 'What is  RAG?', params)
+        self.assertEqual(coalescing_key([1, 2], '  what is rag? ', dict(params)), key)
+        self.assertNotEqual(coalescing_key([1], 'What is RAG?', params), key)
+        self.assertNotEqual(coalescing_key([1, 2], 'What is RAG?', {**params, 'top_k': 8}), key)
+        self.assertNotEqual(coalescing_key([1, 2], 'What is RAG?', {**params, 'conversation_id': 7}), key)
+        self.assertNotEqual(coalescing_key([1, 2], 'What is RAG now?', params), key)
+
+
+class SnapshotRestoreTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.persist_dir = os.path.join(self.tmp, 'chroma')
+        os.makedirs(self.persist_dir)
+        with open(os.path.join(self.persist_dir, 'marker'), 'w') as fh:
+            fh.write('snapshot')
+        self.user = User.objects.create_user(username='heidi')
+        _create_documents(self.user, 1, source='handbook')
+        self.text_id, = store_texts(['snapshot text'])
+        self.archive = os.path.join(self.tmp, 'snapshot.tar')
+        with override_settings(CHROMA_PERSIST_DIR=self.persist_dir):
+            create_snapshot(self.archive)
+
+        self.target = os.path.join(self.tmp, 'target')
+        os.makedirs(self.target)
+        with open(os.path.join(self.target, 'marker'), 'w') as fh:
+            fh.write('current')
+
+    def _marker(self):
+        with open(os.path.join(self.target, 'marker')) as fh:
+            return fh.read()
+
+    def test_missing_users_are_reported_before_anything_changes(self):
+        Document.objects.all().delete()
+        self.user.delete()
+        with override_settings(CHROMA_PERSIST_DIR=self.target):
+            with self.assertRaisesRegex(ValueError, 'do not exist'):
+                restore_snapshot(self.archive)
+        self.assertEqual(self._marker(), 'current')
+        self.assertFalse(Document.objects.exists())
+
+    def test_local_rows_missing_from_the_snapshot_need_replace_db(self):
+        ChunkText.objects.all().delete()
+        store_texts(['local text', 'snapshot text'])
+        with override_settings(CHROMA_PERSIST_DIR=self.target):
+            with self.assertRaisesRegex(ValueError, '--replace-db'):
+                restore_snapshot(self.archive)
+            self.assertEqual(self._marker(), 'current')
+            self.assertEqual(ChunkText.objects.count(), 2)
+
+            manifest = restore_snapshot(self.archive, replace_db=True)
+        self.assertTrue(manifest['database_restored'])
+        self.assertEqual(self._marker(), 'snapshot')
+        self.assertEqual(list(ChunkText.objects.values_list('id', 'text')), [(self.text_id, 'snapshot text')])
+
+    def test_replace_db_deactivates_documents_missing_from_the_snapshot(self):
+        local, = _create_documents(self.user, 1)
+        with override_settings(CHROMA_PERSIST_DIR=self.target):
+            with self.assertRaisesRegex(ValueError, '1 documents'):
+                restore_snapshot(self.archive)
+            restore_snapshot(self.archive, replace_db=True)
+        local.refresh_from_db()
+        self.assertFalse(local.is_active)
+        self.assertEqual(Document.objects.filter(is_active=True).count(), 1)
+
+    def test_restore_elsewhere_leaves_the_live_rows_alone(self):
+        ChunkText.objects.all().delete()
+        live_ids = store_texts(['live text'])
+        with override_settings(CHROMA_PERSIST_DIR=self.persist_dir):
+            manifest = restore_snapshot(self.archive, target_dir=self.target)
+        self.assertFalse(manifest['database_restored'])
+        self.assertEqual(self._marker(), 'snapshot')
+        self.assertEqual(list(ChunkText.objects.values_list('id', 'text')), [(live_ids[0], 'live text')])
+        self.assertEqual(Document.objects.filter(is_active=True).count(), 1)
+
+
+class _KeywordEmbeddings:
+    """Sentences about cats point one way, everything else the other."""
+
+    def embed_documents(self, texts):
+        return [[1.0, 0.0] if 'cat' in text else [0.0, 1.0] for text in texts]
+
+
+class _TextChunk:
+    def __init__(self, text, source='notes', page=None):
+        self.page_content = text
+        self.metadata = {'source': source, 'page': page}
+
+
+CAT_CHUNKS = [
+    (_TextChunk('The weather was mild all week. Our cat sleeps on the warm windowsill.', page=2), 0.2),
+    (_TextChunk('Dogs need daily walks in the park.\n\nShort.'), 0.4),
+]
+
+
+class ExtractiveAnswerTests(SimpleTestCase):
+    def test_split_sentences_reports_offsets_and_skips_fragments(self):
+        text = 'First sentence is long enough. Tiny. Second one asks a question?\n\nThird paragraph text here.'
+        spans = list(split_sentences(text))
+        self.assertEqual([s for s, _, _ in spans], [
+            'First sentence is long enough.', 'Second one asks a question?', 'Third paragraph text here.',
+        ])
+        for sentence, start, end in spans:
+            self.assertEqual(text[start:end], sentence)
+
+    def test_picks_closest_sentence_with_citation_and_offsets(self):
+        result = extractive_answer([1.0, 0.0], CAT_CHUNKS, _KeywordEmbeddings(), max_sentences=1)
+        self.assertEqual(result['answer'], 'Our cat sleeps on the warm windowsill. [1]')
+        self.assertEqual(result['citations'], [{'index': 1, 'source': 'notes', 'page': 2, 'score': 0.2}])
+        highlight, = result['highlights']
+        self.assertEqual(CAT_CHUNKS[0][0].page_content[highlight['start']:highlight['end']],
+                         'Our cat sleeps on the warm windowsill.')
+        self.assertAlmostEqual(result['confidence'], 1.0)
+
+    def test_no_sentences(self):
+        result = extractive_answer([1.0, 0.0], [(_TextChunk('Too short.'), 0.1)], _KeywordEmbeddings())
+        self.assertEqual(result['citations'], [])
+        self.assertEqual(result['confidence'], 0.0)
+        self.assertEqual(extractive_answer([1.0, 0.0], [], _KeywordEmbeddings())['highlights'], [])
+
+    @mock.patch('chatbot.views._get_embeddings', lambda: _KeywordEmbeddings())
+    @mock.patch('chatbot.views.get_generation_scheduler', lambda: GenerationScheduler())
+    def test_auto_mode_calls_llm_only_below_confidence_threshold(self):
+        view = QueryView()
+        respond = lambda query_vector: view._respond(  # noqa: E731
+            SimpleNamespace(id=1), 'q', query_vector, CAT_CHUNKS, [], True, 0.7, 'interactive', 'auto', ''
+        )
+        with mock.patch.object(QueryView, '_generate_answer', return_value=('llm', [], 12)) as generate, \
+                self.settings(RAG_EXTRACTIVE_MIN_CONFIDENCE=0.9):
+            body, prompt_tokens = respond([1.0, 0.0])  # cosine 1.0: answered extractively
+            self.assertEqual((body['answer_mode'], prompt_tokens), ('extractive', 0))
+            generate.assert_not_called()
+
+            body, prompt_tokens = respond([1.0, 1.0])  # cosine ~0.71: below the threshold
+            self.assertEqual((body['answer'], body['answer_mode'], prompt_tokens), ('llm', 'llm', 12))
+            generate.assert_called_once()
+
+
+class _RecordingEmbeddings:
+    """Vectors exactly representable in float32, derived from each text."""
+
+    def __init__(self, delay=None):
+        self.delay = delay
+        self.batches = []
+
+    def embed_documents(self, texts):
+        if self.delay is not None:
+            self.delay.wait(2)
+        if 'boom' in texts:
+            raise ValueError('model exploded')
+        self.batches.append(list(texts))
+        return [[float(len(text)), float(ord(text[0])), -0.5] for text in texts]
+
+
+class EmbeddingServerTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.socket_path = os.path.join(self.tmp, 'embed.sock')
+        # Client and server share a process here, so only the server's unlink may unregister the segment
+        patcher = mock.patch('chatbot.embedding_server.resource_tracker')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _start_server(self, embeddings, **kwargs):
+        server = EmbeddingServer(embeddings, self.socket_path, **kwargs)
+        running = {}
+
+        async def serve():
+            running['loop'], running['task'] = asyncio.get_running_loop(), asyncio.current_task()
+            await server.serve_forever()
+
+        def run():
+            try:
+                asyncio.run(serve())
+            except asyncio.CancelledError:
+                pass
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+
+        def stop():
+            running['loop'].call_soon_threadsafe(running['task'].cancel)
+            thread.join(2)
+        self.addCleanup(stop)
+
+        deadline = time.monotonic() + 2
+        while not os.path.exists(self.socket_path):
+            self.assertLess(time.monotonic(), deadline, 'server never listened')
+            time.sleep(0.005)
+        return server
+
+    def test_vectors_round_trip_through_shared_memory(self):
+        self._start_server(_RecordingEmbeddings())
+        client = EmbeddingServerClient(self.socket_path)
+        self.assertEqual(client.embed_documents(['cat', 'doghouse']), [[3.0, 99.0, -0.5], [8.0, 100.0, -0.5]])
+        self.assertEqual(client.embed_query('a'), [1.0, 97.0, -0.5])
+
+    def test_concurrent_clients_are_batched(self):
+        server = self._start_server(_RecordingEmbeddings(), batch_window=0.1)
+        barrier = threading.Barrier(6)
+        results = {}
+
+        def embed(i):
+            barrier.wait()
+            results[i] = EmbeddingServerClient(self.socket_path).embed_query('x' * (i + 1))
+
+        threads = [threading.Thread(target=embed, args=(i,)) for i in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, {i: [float(i + 1), 120.0, -0.5] for i in range(6)})
+        self.assertEqual(server.stats['requests'], 6)
+        self.assertLess(server.stats['batches'], server.stats['requests'])
+
+    def test_large_inputs_are_split_and_reassembled_in_order(self):
+        embeddings = _RecordingEmbeddings()
+        self._start_server(embeddings, batch_window=0)
+        texts = ['t' * n for n in range(1, 11)]
+        vectors = EmbeddingServerClient(self.socket_path, max_request_texts=4).embed_documents(texts)
+        self.assertEqual([vector[0] for vector in vectors], [float(n) for n in range(1, 11)])
+        self.assertEqual([len(batch) for batch in embeddings.batches], [4, 4, 2])
+
+    def test_server_errors_reach_the_client(self):
+        self._start_server(_RecordingEmbeddings())
+        client = EmbeddingServerClient(self.socket_path)
+        with self.assertRaisesRegex(RuntimeError, 'model exploded'), \
+                self.assertLogs('chatbot.embedding_server', 'ERROR'):
+            client.embed_documents(['fine', 'boom'])
+        # The connection and the server survive the failed batch
+        self.assertEqual(client.embed_query('ok'), [2.0, 111.0, -0.5])
+
+    def test_falls_back_only_when_no_server_is_listening(self):
+        fallback = _RecordingEmbeddings()
+        client = EmbeddingServerClient(self.socket_path, fallback=lambda: fallback)
+        with self.assertLogs('chatbot.embedding_server', 'WARNING'):
+            self.assertEqual(client.embed_query('cat'), [3.0, 99.0, -0.5])
+        self.assertEqual(fallback.batches, [['cat']])
+        with self.assertRaises(FileNotFoundError):
+            EmbeddingServerClient(self.socket_path).embed_query('cat')
+
+    def test_busy_server_times_out_instead_of_falling_back(self):
+        release = threading.Event()
+        server = self._start_server(_RecordingEmbeddings(delay=release))
+        fallback = _RecordingEmbeddings()
+        client = EmbeddingServerClient(self.socket_path, timeout=0.1, fallback=lambda: fallback)
+        with self.assertRaises(TimeoutError):
+            client.embed_query('cat')
+        self.assertEqual(fallback.batches, [])
+
+        # Let the abandoned batch finish before the server shuts down
+        release.set()
+        deadline = time.monotonic() + 2
+        while server.stats['batches'] < 1:
+            self.assertLess(time.monotonic(), deadline, 'batch never finished')
+            time.sleep(0.005)
+
+
+class OnnxExportCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        # A local model directory, so configs are copied without the Hugging Face hub
+        self.model_name = os.path.join(self.tmp, 'model')
+        os.makedirs(self.model_name)
+        self._write(self.model_name, 'modules.json', [
+            {'type': 'sentence_transformers.models.Transformer'},
+            {'type': 'sentence_transformers.models.Pooling'},
+            {'type': 'sentence_transformers.models.Normalize'},
+        ])
+        self._write(self.model_name, 'sentence_bert_config.json', {'max_seq_length': 128})
+        self.cache_root = os.path.join(self.tmp, 'cache')
+
+    def _write(self, directory, name, content):
+        with open(os.path.join(directory, name), 'w') as fh:
+            json.dump(content, fh)
+
+    def _exported(self, *file_names):
+        model_dir = _model_cache_dir(self.cache_root, self.model_name)
+        os.makedirs(model_dir, exist_ok=True)
+        for name in file_names:
+            open(os.path.join(model_dir, name), 'w').close()
+        return model_dir
+
+    def test_model_configs(self):
+        self.assertTrue(uses_normalize(self.model_name))
+        self.assertEqual(max_seq_length(self.model_name), 128)
+        self._write(self.model_name, 'modules.json', [{'type': 'sentence_transformers.models.Pooling'}])
+        self.assertFalse(uses_normalize(self.model_name))
+
+        plain = os.path.join(self.tmp, 'plain')
+        os.makedirs(plain)
+        self.assertFalse(uses_normalize(plain))
+        self.assertEqual(max_seq_length(plain), DEFAULT_MAX_SEQ_LENGTH)
+
+    def test_each_quantization_preset_has_its_own_file(self):
+        self.assertEqual(_onnx_file_name(''), 'model.onnx')
+        self.assertEqual(_onnx_file_name('avx2'), 'model_quantized_avx2.onnx')
+        self.assertNotEqual(_onnx_file_name('avx2'), _onnx_file_name('arm64'))
+
+    # Any attempt to export (rather than reuse) fails on the missing optimum package
+    @mock.patch.dict('sys.modules', {'optimum.onnxruntime': None})
+    def test_existing_exports_are_reused_and_get_their_configs(self):
+        model_dir = self._exported('model.onnx', 'model_quantized_avx2.onnx')
+        path = export_model(self.model_name, self.cache_root)
+        self.assertEqual(path, os.path.join(model_dir, 'model.onnx'))
+        self.assertEqual(
+            export_model(self.model_name, self.cache_root, 'avx2'),
+            os.path.join(model_dir, 'model_quantized_avx2.onnx'),
+        )
+        # Configs missing from exports made before they were cached are fetched
+        self.assertTrue(uses_normalize(model_dir))
+        self.assertEqual(max_seq_length(model_dir), 128)
+
+    @mock.patch.dict('sys.modules', {'optimum.onnxruntime': None})
+    def test_other_presets_are_not_reused(self):
+        self._exported('model.onnx', 'model_quantized_avx2.onnx')
+        with self.assertRaises(ImportError):
+            export_model(self.model_name, self.cache_root, 'avx512')
+        with self.assertRaises(ValueError):
+            export_model(self.model_name, self.cache_root, 'sse4')
@@ -5,7 +5,10 @@ from rest_framework_simplejwt.views import (
 )
 from django.conf import settings
 from django.conf.urls.static import static
-from .views import RegisterView, WhoAmIView, DocumentUploadView, QueryView, UserDocumentsView, DeleteDocumentView
+from .views import (
+    RegisterView, WhoAmIView, DocumentUploadView, QueryView, UserDocumentsView, DeleteDocumentView, MetricsView, ReadinessView,
+    ConversationListView, ConversationDetailView,
+)
 
 urlpatterns = [
     path('auth/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
@@ -16,6 +19,10 @@ urlpatterns = [
     path('documents/', UserDocumentsView.as_view(), name='user_documents'),
     path('documents/<int:document_id>/delete/', DeleteDocumentView.as_view(), name='delete_document'),
     path('query/', QueryView.as_view(), name='rag_query'),
+    path('conversations/', ConversationListView.as_view(), name='conversations'),
+    path('conversations/<int:conversation_id>/', ConversationDetailView.as_view(), name='conversation_detail'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('health/ready/', ReadinessView.as_view(), name='readiness'),
 ]
 
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
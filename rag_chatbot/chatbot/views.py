@@ -1,37 +1,43 @@
 from django.contrib.auth import get_user_model
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
 from django.core.files.storage import default_storage, FileSystemStorage
 from django.core.files.base import ContentFile
 from rest_framework import generics, permissions, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
-try:
-    from langchain.chat_models import init_chat_model  # LangChain unified chat interface
-except Exception:  # pragma: no cover
-    init_chat_model = None
 
 from .serializers import (
     UserRegisterSerializer,
     UserSerializer,
     DocumentUploadSerializer,
     QuerySerializer,
+    ConversationSerializer,
+    ConversationDetailSerializer,
 )
-from .models import Document
+from .models import Document, Conversation, ConversationTurn
+from .conversations import build_history, estimate_tokens, merge_results, recent_chunk_ids, squared_l2
+from .embeddings import get_embeddings
+from .scheduling import GenerationRejected, get_generation_scheduler
+from .coalescing import coalescing_key, get_query_coalescer
+from .snapshots import vectorstore_lock
+from .chunkstore import (
+    DOCUMENT_KEY, PAGE_KEY, USER_KEY, compact_metadata, delete_document_chunks, existing_embeddings, hydrate, store_texts,
+)
+from .warmup import readiness
 
-# LangChain / Chroma imports
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import TextLoader, PyPDFLoader
+# LangChain / Chroma are imported inside the functions that need them so that
+# manage.py commands and worker boot don't pay their import cost (see chatbot.warmup).
+import base64
+import binascii
+import json
 import os
 import time
+import uuid
 from typing import List
 
-try:
-    from transformers import pipeline  # noqa: F401  # kept for potential future use
-except Exception:  # pragma: no cover
-    pipeline = None
-
 
 class RegisterView(generics.CreateAPIView):
     queryset = get_user_model().objects.all()
@@ -48,20 +54,106 @@ class WhoAmIView(generics.RetrieveAPIView):
 
 
 def _get_embeddings():
-    provider = getattr(settings, 'RAG_EMBEDDINGS_PROVIDER', 'huggingface')
-    model_name = getattr(
-        settings, 'RAG_HF_MODEL_NAME', 'sentence-transformers/all-MiniLM-L6-v2'
-    )
-    return HuggingFaceEmbeddings(model_name=model_name) # embeddings Object
+    return get_embeddings() # shared embeddings Object (in-process model or embedding server client)
 
 
 def _get_vectorstore():
+    from langchain_community.vectorstores import Chroma
+
     persist_dir = getattr(settings, 'CHROMA_PERSIST_DIR', os.path.join(settings.BASE_DIR, 'chroma'))
     embeddings = _get_embeddings() # getting embeddings Object
     return Chroma(collection_name='documents', embedding_function=embeddings, persist_directory=persist_dir)
 
 
+def _hydrate_chunks(chunk_ids: List[str], metadatas: List[dict]) -> List:
+    """Chunk ``Document``s for compact Chroma entries; text and source come from the database"""
+    from langchain_core.documents import Document as ChunkDocument
+
+    return [
+        ChunkDocument(id=chunk_id, page_content=text, metadata=metadata)
+        for chunk_id, (text, metadata) in zip(chunk_ids, hydrate(metadatas))
+    ]
+
+
+def _search_chunks(query_vector, k: int, where_filter: dict) -> List:
+    """Nearest chunks as ``(Document, distance)`` pairs, closest first; ``Document.id`` is the Chroma id"""
+    result = _get_vectorstore()._collection.query(
+        query_embeddings=[query_vector], n_results=k, where=where_filter,
+        include=['metadatas', 'distances'],
+    )
+    docs = _hydrate_chunks(result['ids'][0], result['metadatas'][0])
+    return list(zip(docs, result['distances'][0]))
+
+
+def _get_chunks(chunk_ids: List[str], query_vector) -> List:
+    """Fetch chunks by id as ``(Document, distance to query_vector)`` pairs"""
+    result = _get_vectorstore()._collection.get(ids=chunk_ids, include=['metadatas', 'embeddings'])
+    docs = _hydrate_chunks(result['ids'], result['metadatas'])
+    return [(doc, squared_l2(embedding, query_vector)) for doc, embedding in zip(docs, result['embeddings'])]
+
+
+def _visible_user_ids(user) -> List[int]:
+    """IDs of the users whose documents ``user`` may retrieve from.
+
+    Always the user themselves, plus every member of the user's groups listed in
+    RAG_SHARED_CORPUS_GROUPS (team-shared corpora).
+    """
+    user_ids = {user.id}
+    shared_groups = getattr(settings, 'RAG_SHARED_CORPUS_GROUPS', [])
+    if shared_groups:
+        user_ids.update(
+            get_user_model().objects
+            .filter(groups__name__in=shared_groups, groups__user=user)
+            .values_list('id', flat=True)
+        )
+    return sorted(user_ids)
+
+
+QUERY_FILTER_FIELDS = ('source', 'document_ids', 'page_from', 'page_to', 'uploaded_after', 'uploaded_before')
+
+
+def _build_where_filter(visible_user_ids: List[int], filters: dict):
+    """Translate query filters into a Chroma ``where`` clause.
+
+    Source, document and upload-date filters are resolved against ``Document``
+    rows the user may see (which also drops foreign or deleted document IDs) and
+    pushed down as a document condition on the compact metadata (see
+    ``chatbot.chunkstore``). Returns None when no document matches.
+    """
+    if len(visible_user_ids) == 1:
+        conditions = [{USER_KEY: {'$eq': visible_user_ids[0]}}]
+    else:
+        conditions = [{USER_KEY: {'$in': list(visible_user_ids)}}]
+
+    if any(filters.get(name) for name in ('source', 'document_ids', 'uploaded_after', 'uploaded_before')):
+        documents = Document.objects.filter(user_id__in=visible_user_ids, is_active=True)
+        if filters.get('source'):
+            # Documents uploaded before Document.source existed fall back to their filename
+            documents = documents.filter(
+                Q(source=filters['source']) | Q(source='', filename=filters['source'])
+            )
+        if 'document_ids' in filters:
+            documents = documents.filter(id__in=filters['document_ids'])
+        if 'uploaded_after' in filters:
+            documents = documents.filter(upload_date__gte=filters['uploaded_after'])
+        if 'uploaded_before' in filters:
+            documents = documents.filter(upload_date__lte=filters['uploaded_before'])
+        document_ids = list(documents.values_list('id', flat=True))
+        if not document_ids:
+            return None
+        conditions.append({DOCUMENT_KEY: {'$in': document_ids}})
+
+    if 'page_from' in filters:
+        conditions.append({PAGE_KEY: {'$gte': filters['page_from']}})
+    if 'page_to' in filters:
+        conditions.append({PAGE_KEY: {'$lte': filters['page_to']}})
+
+    return conditions[0] if len(conditions) == 1 else {'$and': conditions}
+
+
 def _load_file_to_documents(file_path: str, source: str):
+    from langchain_community.document_loaders import TextLoader, PyPDFLoader
+
     ext = os.path.splitext(file_path)[1].lower()
     docs = []
     if ext in ['.txt', '.md', '.csv', '.log']:
@@ -103,50 +195,64 @@ class DocumentUploadView(APIView):
             saved_path = os.path.join(user_dir, saved_name)
             saved_paths.append(saved_path)
             
-            # Create Document model instance
-            document = Document.objects.create(
+            # Saved below together with its chunks, so snapshots never see one without the other
+            document = Document(
                 user=request.user,
                 title=os.path.splitext(f.name)[0],  # filename without extension
                 filename=f.name,
                 file_path=saved_path,
                 file_size=f.size,
                 file_type=f.content_type or os.path.splitext(f.name)[1],
+                source=source or saved_name,
                 chroma_collection_id=f"user_{request.user.id}_{os.path.splitext(f.name)[0]}_{int(time.time())}"
             )
             document_instances.append(document)
 
-        # Load and chunk documents with document IDs
+        # Load and chunk documents
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
         all_chunks = []
-        for i, p in enumerate(saved_paths):
+        chunk_documents = []  # the Document each chunk belongs to (and so its user and source)
+        for document, p in zip(document_instances, saved_paths):
             raw_docs = _load_file_to_documents(p, source=source)
             if raw_docs:
                 splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=200)
                 doc_chunks = splitter.split_documents(raw_docs)
-                
-                # Add document ID and user ID to metadata for each chunk
-                doc_id = document_instances[i].id
-                for chunk in doc_chunks:
-                    chunk.metadata = {
-                        **chunk.metadata,
-                        'user_id': str(request.user.id),
-                        'document_id': str(doc_id)
-                    }
                 all_chunks.extend(doc_chunks)
+                chunk_documents.extend([document] * len(doc_chunks))
 
         if not all_chunks:
             return Response({'detail': 'No readable documents found.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        vectordb = _get_vectorstore()
-        vectordb.add_documents(all_chunks)
-        try:
-            vectordb.persist()
-        except Exception:
-            pass
+        texts = [chunk.page_content for chunk in all_chunks]
+        collection = _get_vectorstore()._collection
+        # Duplicate chunks (re-uploads, shared boilerplate) reuse the embedding already stored
+        vectors = existing_embeddings(collection, texts)
+        pending = [text for text in dict.fromkeys(texts) if text not in vectors]
+        if pending:
+            vectors.update(zip(pending, _get_embeddings().embed_documents(pending)))
+
+        # Chunk text is stored once per distinct content; Chroma only gets vectors and integer keys.
+        # Document rows and text references are written in the same transaction as the add, so a
+        # failed add takes them back, and under the lock so a snapshot sees all of it or none.
+        with vectorstore_lock(), transaction.atomic():
+            for document in document_instances:
+                document.save()
+            text_ids = store_texts(texts)
+            collection.add(
+                ids=[str(uuid.uuid4()) for _ in all_chunks],
+                embeddings=[vectors[text] for text in texts],
+                metadatas=[
+                    compact_metadata(request.user.id, document.id, text_id, chunk.metadata.get('page'))
+                    for chunk, document, text_id in zip(all_chunks, chunk_documents, text_ids)
+                ],
+            )
 
         return Response({
             'detail': 'Documents ingested', 
             'files': [os.path.basename(p) for p in saved_paths], 
             'chunks': len(all_chunks),
+            'embedded_chunks': len(pending),
             'document_ids': [doc.id for doc in document_instances]
         })
 
@@ -158,25 +264,62 @@ class QueryView(APIView):
         serializer = QuerySerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         query = serializer.validated_data['query']
-        top_k = serializer.validated_data.get('top_k', 4)
-        generate = serializer.validated_data.get('generate', True)
-        temperature = serializer.validated_data.get('temperature', 0.7)
-
-        vectordb = _get_vectorstore()
-        # Build Chroma where filter using operators
-        where_filter = {'user_id': {'$eq': str(request.user.id)}}
-
-        # Retrieve with scores; Chroma returns distance (lower is better)
-        fetch_k = int(getattr(settings, 'RAG_FETCH_K', max(top_k * 5, 20)))
-        results_with_scores = vectordb.similarity_search_with_score(
-            query, k=fetch_k, filter=where_filter
+        params = {
+            'top_k': serializer.validated_data.get('top_k', 4),
+            'generate': serializer.validated_data.get('generate', True),
+            'temperature': serializer.validated_data.get('temperature', 0.7),
+            'priority': serializer.validated_data.get('priority', 'interactive'),
+            'answer_mode': serializer.validated_data.get('answer_mode', 'llm'),
+            'filters': {
+                name: serializer.validated_data[name]
+                for name in QUERY_FILTER_FIELDS
+                if serializer.validated_data.get(name) not in (None, '')
+            },
+        }
+
+        conversation = None
+        conversation_id = serializer.validated_data.get('conversation_id')
+        if conversation_id is not None:
+            conversation = Conversation.objects.filter(id=conversation_id, user=request.user).first()
+            if conversation is None:
+                return Response({'detail': 'Conversation not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        # Identical in-flight queries over the same visible corpus share one retrieval + generation
+        visible_user_ids = _visible_user_ids(request.user)
+        key = coalescing_key(visible_user_ids, query, {**params, 'conversation_id': conversation_id})
+        body, coalesced = get_query_coalescer().do(
+            key, lambda: self._answer(request.user, visible_user_ids, query, conversation=conversation, **params)
         )
+        return Response({**body, 'coalesced': coalesced})
+
+    def _answer(self, user, visible_user_ids: List[int], query: str, top_k: int, generate: bool,
+                temperature: float, priority: str, answer_mode: str, filters: dict, conversation=None) -> dict:
+        # Embed once; the vector is reused for context reuse and extractive answers
+        query_vector = _get_embeddings().embed_query(query)
+        where_filter = _build_where_filter(visible_user_ids, filters)
+
+        turns = []
+        if conversation is not None:
+            max_turns = getattr(settings, 'RAG_CONVERSATION_MAX_TURNS', 20)
+            turns = list(conversation.turns.order_by('-created_at')[:max_turns])[::-1]
+
+        reused = []
+        if where_filter is not None and turns and not filters:
+            reused = self._reuse_context(turns, query_vector, visible_user_ids)
+
+        search_skipped = False
+        if where_filter is None:
+            # Document/date filters matched no documents the user can see
+            top_results = []
+        elif len(reused) >= top_k:
+            # Earlier turns already retrieved enough relevant context
+            top_results = reused[:top_k]
+            search_skipped = True
+        else:
+            # The filter is applied inside the vector store, so asking for exactly top_k
+            # still returns a full top_k however narrow the filter is.
+            top_results = merge_results(reused, _search_chunks(query_vector, top_k, where_filter), top_k)
 
-        # Sort by ascending distance and take top_k
-        results_with_scores.sort(key=lambda x: x[1])
-        top_results = results_with_scores[:top_k]
-
-        context_blocks: List[str] = [doc.page_content for doc, _ in top_results]
         payload = [
             {
                 'content': doc.page_content,
@@ -187,13 +330,89 @@ class QueryView(APIView):
             for doc, dist in top_results
         ]
 
+        history = ''
+        if turns:
+            history = build_history(turns, getattr(settings, 'RAG_CONVERSATION_HISTORY_TOKENS', 800))
+        body, prompt_tokens = self._respond(
+            user, query, query_vector, top_results, payload, generate, temperature, priority, answer_mode, history
+        )
+
+        if conversation is not None:
+            reused_ids = {doc.id for doc, _ in reused}
+            reused_count = sum(1 for doc, _ in top_results if doc.id in reused_ids)
+            turn = ConversationTurn.objects.create(
+                conversation=conversation,
+                query=query,
+                answer=body.get('answer', ''),
+                chunk_ids=[doc.id for doc, _ in top_results],
+                reused_chunks=reused_count,
+                retrieved_chunks=len(top_results) - reused_count,
+                prompt_tokens=prompt_tokens,
+            )
+            if not conversation.title:
+                conversation.title = query[:80]
+            conversation.save(update_fields=['title', 'updated_at'])
+            body['conversation'] = {
+                'id': conversation.id,
+                'turn_id': turn.id,
+                'reused_chunks': turn.reused_chunks,
+                'retrieved_chunks': turn.retrieved_chunks,
+                'search_skipped': search_skipped,
+                'prompt_tokens': prompt_tokens,
+                'history_tokens': estimate_tokens(history) if history else 0,
+            }
+        return body
+
+    def _respond(self, user, query: str, query_vector, top_results: List, payload: List, generate: bool,
+                 temperature: float, priority: str, answer_mode: str, history: str):
+        """Build the response body; returns it with the estimated LLM prompt size."""
         if not generate:
-            return Response({'results': payload})
+            return {'results': payload}, 0
 
-        answer, citations = self._generate_answer(query, top_results, temperature)
-        return Response({'results': payload, 'answer': answer, 'citations': citations})
+        extractive = None
+        if answer_mode in ('extractive', 'auto'):
+            extractive = self._extractive_answer(query_vector, top_results)
+            min_confidence = getattr(settings, 'RAG_EXTRACTIVE_MIN_CONFIDENCE', 0.6)
+            if answer_mode == 'extractive' or extractive['confidence'] >= min_confidence:
+                return {'results': payload, **extractive, 'answer_mode': 'extractive'}, 0
 
-    def _generate_answer(self, query: str, results: List, temperature: float):
+        try:
+            with get_generation_scheduler().slot(user.id, priority):
+                answer, citations, prompt_tokens = self._generate_answer(query, top_results, temperature, history)
+        except GenerationRejected as e:
+            fallback = {'generation_skipped': e.reason}
+        except Exception as e:
+            fallback = {'generation_error': str(e)}
+        else:
+            return {'results': payload, 'answer': answer, 'citations': citations, 'answer_mode': 'llm'}, prompt_tokens
+
+        # The LLM is overloaded, rate limited or too slow: answer extractively instead
+        extractive = extractive or self._extractive_answer(query_vector, top_results)
+        return {'results': payload, **extractive, **fallback, 'answer_mode': 'extractive'}, 0
+
+    def _reuse_context(self, turns: List, query_vector, visible_user_ids: List[int]) -> List:
+        """Chunks of recent turns that are still relevant to the new query, closest first"""
+        chunk_ids = recent_chunk_ids(turns, getattr(settings, 'RAG_CONVERSATION_CONTEXT_TURNS', 3))
+        if not chunk_ids:
+            return []
+        max_distance = getattr(settings, 'RAG_CONVERSATION_REUSE_MAX_DISTANCE', 1.0)
+        visible = {str(uid) for uid in visible_user_ids}
+        candidates = [
+            (doc, dist) for doc, dist in _get_chunks(chunk_ids, query_vector)
+            # Chunks of deleted documents are gone from the store; re-check visibility anyway
+            if dist <= max_distance and doc.metadata.get('user_id') in visible
+        ]
+        return sorted(candidates, key=lambda x: x[1])
+
+    def _extractive_answer(self, query_vector, results: List) -> dict:
+        from .extractive import extractive_answer
+
+        return extractive_answer(
+            query_vector, results, _get_embeddings(),
+            max_sentences=getattr(settings, 'RAG_EXTRACTIVE_MAX_SENTENCES', 3),
+        )
+
+    def _generate_answer(self, query: str, results: List, temperature: float, history: str = ''):
         # Prepare numbered, source-aware context to enable citations
         numbered_context_lines: List[str] = []
         citations: List[dict] = []
@@ -205,65 +424,162 @@ class QueryView(APIView):
             citations.append({'index': idx, 'source': source, 'page': page, 'score': sim})
 
         context_text = "\n\n".join(numbered_context_lines)
+        history_text = f"Conversation so far:\n{history}\n\n" if history else ""
         prompt = (
             "You are a careful, grounded assistant. Use ONLY the provided context blocks to answer.\n"
             "- Cite sources inline like [1], [2] referencing the numbered blocks.\n"
             "- If the answer isn't supported by the context, say you don't know.\n"
             "- Prefer concise, direct answers.\n\n"
+            f"{history_text}"
             f"Context blocks (numbered):\n{context_text}\n\nQuestion: {query}\nAnswer (with citations):"
         )
+        prompt_tokens = estimate_tokens(prompt)
         try:
-            if init_chat_model is None:
-                return "LangChain init_chat_model is not available. Please install/update langchain."
+            from langchain.chat_models import init_chat_model  # LangChain unified chat interface
+        except Exception:  # pragma: no cover
+            return "LangChain init_chat_model is not available. Please install/update langchain.", citations, 0
+
+        model_name = getattr(settings, 'RAG_LLM_MODEL', 'gemini-2.5-flash')
+        api_key = (
+            getattr(settings, 'GEMINI_API_KEY', None)
+            or getattr(settings, 'GOOGLE_API_KEY', None)
+        )
 
-            model_name = getattr(settings, 'RAG_LLM_MODEL', 'gemini-2.5-flash')
-            api_key = (
-                getattr(settings, 'GEMINI_API_KEY', None)
-                or getattr(settings, 'GOOGLE_API_KEY', None)
-            )
+        # Provider errors (rate limits, timeouts) propagate so the caller can fall back
+        chat = init_chat_model(
+            model_name,
+            model_provider="google_genai",
+            temperature=temperature,
+            api_key=api_key,
+            timeout=getattr(settings, 'RAG_LLM_TIMEOUT', None),
+            # Retrying with backoff would hold the generation slot; the extractive fallback answers instead
+            max_retries=getattr(settings, 'RAG_LLM_MAX_RETRIES', 0),
+        )
 
-            chat = init_chat_model(
-                model_name,
-                model_provider="google_genai",
-                temperature=temperature,
-                api_key=api_key,
-            )
+        ai_message = chat.invoke(prompt)
+        # LangChain returns an AIMessage with .content
+        text = getattr(ai_message, 'content', None)
+        if isinstance(text, str) and text.strip():
+            return text.strip(), citations, prompt_tokens
+        return "No response generated.", citations, prompt_tokens
 
-            ai_message = chat.invoke(prompt)
-            # LangChain returns an AIMessage with .content
-            text = getattr(ai_message, 'content', None)
-            if isinstance(text, str) and text.strip():
-                return text.strip(), citations
-            return "No response generated.", citations
-        except Exception as e:
-            return f"Generation error: {str(e)}", citations
+
+class ConversationListView(generics.ListCreateAPIView):
+    """List the user's conversations or start a new one"""
+    serializer_class = ConversationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return Conversation.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+
+class ConversationDetailView(generics.RetrieveDestroyAPIView):
+    """A conversation with its turns and per-turn retrieval/prompt statistics"""
+    serializer_class = ConversationDetailSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    lookup_url_kwarg = 'conversation_id'
+
+    def get_queryset(self):
+        return Conversation.objects.filter(user=self.request.user).prefetch_related('turns')
+
+
+class ReadinessView(APIView):
+    """Readiness probe: 503 until this worker's requested warm-up has finished"""
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+
+    def get(self, request):
+        state = readiness()
+        return Response(state, status=status.HTTP_200_OK if state['ready'] else status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+class MetricsView(APIView):
+    """Runtime metrics for operators (generation queue depth, wait times, ...)"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'generation': get_generation_scheduler().snapshot(),
+            'query_coalescing': get_query_coalescer().stats(),
+        })
+
+
+# Public document fields -> model fields needed to produce them
+DOCUMENT_LIST_FIELDS = {
+    'id': ('id',),
+    'title': ('title',),
+    'filename': ('filename',),
+    'file_size': ('file_size',),
+    'file_size_human': ('file_size',),
+    'file_type': ('file_type',),
+    'upload_date': ('upload_date',),
+    'last_modified': ('last_modified',),
+    'chroma_collection_id': ('chroma_collection_id',),
+}
+
+
+def _encode_document_cursor(doc) -> str:
+    raw = json.dumps([doc.upload_date.isoformat(), doc.id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def _decode_document_cursor(cursor: str):
+    upload_date, doc_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    parsed = parse_datetime(upload_date)
+    if parsed is None or not isinstance(doc_id, int):
+        raise ValueError('Invalid cursor')
+    return parsed, doc_id
 
 
 class UserDocumentsView(APIView):
-    """View to list user's uploaded documents"""
+    """View to list user's uploaded documents, newest first, one keyset page at a time"""
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
-        """Get all documents uploaded by the current user"""
-        documents = Document.objects.filter(user=request.user, is_active=True).order_by('-upload_date')
-        
-        document_data = []
-        for doc in documents:
-            document_data.append({
-                'id': doc.id,
-                'title': doc.title,
-                'filename': doc.filename,
-                'file_size': doc.file_size,
-                'file_size_human': doc.file_size_human,
-                'file_type': doc.file_type,
-                'upload_date': doc.upload_date,
-                'last_modified': doc.last_modified,
-                'chroma_collection_id': doc.chroma_collection_id,
-            })
+        """Get a page of documents uploaded by the current user
+
+        Query params: ``limit`` (page size), ``cursor`` (``next_cursor`` of the
+        previous page) and ``fields`` (comma-separated subset of fields).
+        """
+        default_limit = getattr(settings, 'RAG_DOCUMENTS_PAGE_SIZE', 50)
+        max_limit = getattr(settings, 'RAG_DOCUMENTS_MAX_PAGE_SIZE', 200)
+        try:
+            limit = min(max(int(request.query_params.get('limit', default_limit)), 1), max_limit)
+        except ValueError:
+            return Response({'detail': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        fields = [f for f in request.query_params.get('fields', '').split(',') if f] or list(DOCUMENT_LIST_FIELDS)
+        unknown = [f for f in fields if f not in DOCUMENT_LIST_FIELDS]
+        if unknown:
+            return Response({'detail': f'Unknown fields: {", ".join(unknown)}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Served by the (user, is_active, upload_date) index; id breaks ties between equal timestamps
+        documents = Document.objects.filter(user=request.user, is_active=True).order_by('-upload_date', '-id')
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            try:
+                upload_date, doc_id = _decode_document_cursor(cursor)
+            except (ValueError, TypeError, binascii.Error):
+                return Response({'detail': 'Invalid cursor'}, status=status.HTTP_400_BAD_REQUEST)
+            documents = documents.filter(
+                Q(upload_date__lt=upload_date) | Q(upload_date=upload_date, id__lt=doc_id)
+            )
+
+        model_fields = {'id', 'upload_date'}.union(*(DOCUMENT_LIST_FIELDS[f] for f in fields))
+        # Fetch one extra row to know whether there is a next page
+        page = list(documents.only(*model_fields)[:limit + 1])
+        has_more = len(page) > limit
+        page = page[:limit]
+
+        document_data = [{f: getattr(doc, f) for f in fields} for doc in page]
         
         return Response({
             'documents': document_data,
-            'count': len(document_data)
+            'count': len(document_data),
+            'next_cursor': _encode_document_cursor(page[-1]) if has_more else None,
         })
 
 
@@ -279,58 +595,18 @@ class DeleteDocumentView(APIView):
             return Response({'detail': 'Document not found'}, status=status.HTTP_404_NOT_FOUND)
         
         try:
-            # Delete from Chroma DB using document ID
-            self._delete_from_chroma_db(document.id)
-            
+            # Delete the chunks and mark the document inactive (soft delete) together, under the
+            # vector store lock, so a snapshot never sees one change without the other
+            with vectorstore_lock(), transaction.atomic():
+                delete_document_chunks(document.id)
+                document.is_active = False
+                document.save()
+
             # Delete the physical file
             if document.file_path and os.path.exists(document.file_path):
                 os.remove(document.file_path)
-            
-            # Mark document as inactive (soft delete)
-            document.is_active = False
-            document.save()
-            
+
             return Response({'detail': f'Document "{document.title}" deleted successfully'})
             
         except Exception as e:
             return Response({'detail': f'Error deleting document: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    
-    def _delete_from_chroma_db(self, document_id):
-        """Helper method to delete document chunks from Chroma DB"""
-        try:
-            # Get the vectorstore
-            vectordb = _get_vectorstore()
-            
-            # Get all documents with the specific document_id
-            # We need to search for documents with this document_id in metadata
-            # Since Chroma doesn't have a direct delete by metadata filter,
-            # we'll need to get the document IDs and delete them
-            
-            # First, let's get all documents to find the ones with our document_id
-            # This is a workaround since Chroma doesn't support delete by metadata filter directly
-            try:
-                # Get the collection
-                collection = vectordb._collection
-                
-                # Query for documents with the specific document_id
-                results = collection.get(
-                    where={"document_id": {"$eq": str(document_id)}}
-                )
-                
-                if results and results.get('ids'):
-                    # Delete the documents by their IDs
-                    collection.delete(ids=results['ids'])
-                    
-                    # Persist the changes
-                    try:
-                        vectordb.persist()
-                    except Exception:
-                        pass  # Persist might not be available in all Chroma versions
-                        
-            except Exception as e:
-                # Fallback: if the above doesn't work, we'll log the error but continue
-                print(f"Warning: Could not delete from Chroma DB: {str(e)}")
-                # Don't raise the exception, just log it since the file deletion is more important
-                
-        except Exception as e:
-            raise Exception(f"Failed to delete from Chroma DB: {str(e)}")
@@ -0,0 +1,93 @@
+"""
+Opt-in warm-up for production web workers.
+
+Heavy dependencies (LangChain, Chroma, the embedding model) are imported lazily,
+so a fresh worker pays for them on its first query. Setting
+``RAG_WARMUP_ON_STARTUP=true`` makes the WSGI/ASGI entry points call
+:func:`warm_up` before the worker starts serving requests instead, or in a
+background thread with ``RAG_WARMUP_BACKGROUND=true``; the readiness endpoint
+reports 503 until it has finished.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+_state = {'status': 'cold', 'seconds': None, 'bytes_preloaded': 0, 'error': None}
+_state_lock = threading.Lock()
+
+
+def _set_state(**values):
+    with _state_lock:
+        _state.update(values)
+
+
+def readiness() -> dict:
+    """Current warm-up state of this worker.
+
+    ``ready`` is False only while a requested warm-up is pending or running, or
+    after it failed; workers that don't warm up are ready (but cold) right away.
+    """
+    with _state_lock:
+        state = dict(_state)
+    if state['status'] == 'cold':
+        state['ready'] = not getattr(settings, 'RAG_WARMUP_ON_STARTUP', False)
+    else:
+        state['ready'] = state['status'] == 'ready'
+    return state
+
+
+def warm_up() -> float:
+    """Import the RAG stack, load the embedding model, page the vector index into
+    memory and run a synthetic query.
+
+    Returns the time spent in seconds.
+    """
+    _set_state(status='warming', error=None)
+    start = time.perf_counter()
+    try:
+        import langchain_text_splitters  # noqa: F401
+        from langchain_community import document_loaders  # noqa: F401
+        try:
+            from langchain.chat_models import init_chat_model  # noqa: F401
+        except Exception:  # pragma: no cover
+            pass
+
+        from .snapshots import page_in_persist_dir
+        from .views import _get_embeddings, _get_vectorstore
+
+        preloaded = 0
+        if getattr(settings, 'RAG_PRELOAD_VECTORSTORE', True):
+            preloaded = page_in_persist_dir()
+        _get_embeddings().embed_query('warm-up')
+        # Loads the HNSW segment into Chroma's memory; the filter matches nothing real
+        _get_vectorstore().similarity_search('warm-up', k=1, filter={'u': {'$eq': -1}})
+    except Exception as e:
+        _set_state(status='failed', error=str(e))
+        raise
+
+    elapsed = time.perf_counter() - start
+    _set_state(status='ready', seconds=elapsed, bytes_preloaded=preloaded)
+    logger.info('RAG warm-up finished in %.2fs (%d bytes of vector store preloaded)', elapsed, preloaded)
+    return elapsed
+
+
+def warm_up_if_enabled():
+    if not getattr(settings, 'RAG_WARMUP_ON_STARTUP', False):
+        return
+    if getattr(settings, 'RAG_WARMUP_BACKGROUND', False):
+        _set_state(status='warming')
+        threading.Thread(target=_warm_up_logged, name='rag-warmup', daemon=True).start()
+    else:
+        warm_up()
+
+
+def _warm_up_logged():
+    try:
+        warm_up()
+    except Exception:
+        logger.exception('RAG warm-up failed')
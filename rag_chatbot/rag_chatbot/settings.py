@@ -157,10 +157,36 @@ MEDIA_ROOT = BASE_DIR / 'media'
 CHROMA_PERSIST_DIR = os.path.join(BASE_DIR, 'chroma')
 
 # RAG configuration
-# Provider can be 'openai' or 'huggingface'. Default huggingface.
+# Provider can be 'huggingface' (in-process PyTorch model), 'onnx' (ONNX Runtime export of the same model)
+# or 'server' (shared embedding server). Default huggingface.
 RAG_EMBEDDINGS_PROVIDER = os.environ.get('RAG_EMBEDDINGS_PROVIDER', 'huggingface')
 RAG_HF_MODEL_NAME = os.environ.get('RAG_HF_MODEL_NAME', 'sentence-transformers/all-MiniLM-L6-v2')
 
+# ONNX Runtime embeddings (RAG_EMBEDDINGS_PROVIDER=onnx); exports are cached per model under RAG_ONNX_CACHE_DIR
+RAG_ONNX_CACHE_DIR = os.environ.get('RAG_ONNX_CACHE_DIR', os.path.join(BASE_DIR, 'onnx_models'))
+# Dynamic int8 quantization preset: '' (disabled), 'avx2', 'avx512', 'avx512_vnni' or 'arm64'
+RAG_ONNX_QUANTIZATION = os.environ.get('RAG_ONNX_QUANTIZATION', '')
+RAG_ONNX_INTRA_OP_THREADS = int(os.environ.get('RAG_ONNX_INTRA_OP_THREADS', '0'))
+RAG_ONNX_BATCH_SIZE = int(os.environ.get('RAG_ONNX_BATCH_SIZE', '32'))
+
+# Shared embedding server (`python manage.py run_embedding_server`), used when RAG_EMBEDDINGS_PROVIDER=server
+RAG_EMBEDDING_SERVER_SOCKET = os.environ.get('RAG_EMBEDDING_SERVER_SOCKET', os.path.join(BASE_DIR, 'embeddings.sock'))
+RAG_EMBEDDING_SERVER_BACKEND = os.environ.get('RAG_EMBEDDING_SERVER_BACKEND', 'huggingface')
+RAG_EMBEDDING_SERVER_BATCH_WINDOW_MS = float(os.environ.get('RAG_EMBEDDING_SERVER_BATCH_WINDOW_MS', '5'))
+RAG_EMBEDDING_SERVER_MAX_BATCH = int(os.environ.get('RAG_EMBEDDING_SERVER_MAX_BATCH', '64'))
+# Seconds a worker waits for one batch (at most RAG_EMBEDDING_SERVER_MAX_BATCH texts); exceeding it is an error
+RAG_EMBEDDING_SERVER_TIMEOUT = float(os.environ.get('RAG_EMBEDDING_SERVER_TIMEOUT', '30'))
+# Fall back to an in-process model when no server is listening (never when it is just slow)
+RAG_EMBEDDING_SERVER_FALLBACK = os.environ.get('RAG_EMBEDDING_SERVER_FALLBACK', 'true').lower() == 'true'
+
+# Import the RAG stack and load the embedding model when a WSGI/ASGI worker boots
+# (instead of on its first query). Recommended for production workers.
+RAG_WARMUP_ON_STARTUP = os.environ.get('RAG_WARMUP_ON_STARTUP', 'false').lower() == 'true'
+# Warm up in a background thread; /api/health/ready/ answers 503 until it has finished
+RAG_WARMUP_BACKGROUND = os.environ.get('RAG_WARMUP_BACKGROUND', 'false').lower() == 'true'
+# Read the Chroma persist directory into the page cache during warm-up
+RAG_PRELOAD_VECTORSTORE = os.environ.get('RAG_PRELOAD_VECTORSTORE', 'true').lower() == 'true'
+
 # LLM for generation
 RAG_LLM_PROVIDER = os.environ.get('RAG_LLM_PROVIDER', 'huggingface')
 RAG_OPENAI_MODEL = os.environ.get('RAG_OPENAI_MODEL', 'gpt-4o-mini')
@@ -169,6 +195,25 @@ RAG_LLM_MAX_TOKENS = int(os.environ.get('RAG_LLM_MAX_TOKENS', '512'))
 
 # Explicit Gemini model to use for generation
 RAG_LLM_MODEL = os.environ.get('RAG_LLM_MODEL', 'gemini-2.5-flash')
+# Seconds before a slow LLM call is abandoned in favour of an extractive answer
+RAG_LLM_TIMEOUT = float(os.environ.get('RAG_LLM_TIMEOUT', '30'))
+# Provider retries of a failed or rate-limited LLM call before falling back to an extractive answer
+RAG_LLM_MAX_RETRIES = int(os.environ.get('RAG_LLM_MAX_RETRIES', '0'))
+
+# Extractive (no-LLM) answers: sentences returned, and the cosine score at which
+# answer_mode=auto skips generation
+RAG_EXTRACTIVE_MAX_SENTENCES = int(os.environ.get('RAG_EXTRACTIVE_MAX_SENTENCES', '3'))
+RAG_EXTRACTIVE_MIN_CONFIDENCE = float(os.environ.get('RAG_EXTRACTIVE_MIN_CONFIDENCE', '0.6'))
+
+# Generation admission control: concurrent LLM calls (global / per user), bounded wait queue per
+# worker and the longest a request waits for a slot before falling back to retrieval-only results.
+# The caps are shared by every worker on the host through lock files in RAG_GEN_SLOT_DIR; set it
+# to an empty string to apply them per worker process instead.
+RAG_GEN_MAX_CONCURRENCY = int(os.environ.get('RAG_GEN_MAX_CONCURRENCY', '4'))
+RAG_GEN_MAX_PER_USER = int(os.environ.get('RAG_GEN_MAX_PER_USER', '2'))
+RAG_GEN_MAX_QUEUE = int(os.environ.get('RAG_GEN_MAX_QUEUE', '32'))
+RAG_GEN_QUEUE_TIMEOUT = float(os.environ.get('RAG_GEN_QUEUE_TIMEOUT', '10'))
+RAG_GEN_SLOT_DIR = os.environ.get('RAG_GEN_SLOT_DIR', f'{CHROMA_PERSIST_DIR}.gen-slots')
 
 # Gemini API key
 from dotenv import load_dotenv
@@ -176,9 +221,22 @@ load_dotenv()
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY', '')
 
 # Retrieval and ranking knobs
-RAG_FETCH_K = int(os.environ.get('RAG_FETCH_K', '20'))
 RAG_SCORE_THRESHOLD = float(os.environ.get('RAG_SCORE_THRESHOLD', '0.2'))
 
+# Conversations: how many recent turns' chunks a follow-up may reuse, the max squared-L2
+# distance for a reused chunk to still count as relevant, and the token budget of the history
+RAG_CONVERSATION_CONTEXT_TURNS = int(os.environ.get('RAG_CONVERSATION_CONTEXT_TURNS', '3'))
+RAG_CONVERSATION_REUSE_MAX_DISTANCE = float(os.environ.get('RAG_CONVERSATION_REUSE_MAX_DISTANCE', '1.0'))
+RAG_CONVERSATION_HISTORY_TOKENS = int(os.environ.get('RAG_CONVERSATION_HISTORY_TOKENS', '800'))
+RAG_CONVERSATION_MAX_TURNS = int(os.environ.get('RAG_CONVERSATION_MAX_TURNS', '20'))
+
+# Page sizes of the documents/ listing (keyset paginated)
+RAG_DOCUMENTS_PAGE_SIZE = int(os.environ.get('RAG_DOCUMENTS_PAGE_SIZE', '50'))
+RAG_DOCUMENTS_MAX_PAGE_SIZE = int(os.environ.get('RAG_DOCUMENTS_MAX_PAGE_SIZE', '200'))
+
+# Comma-separated auth group names whose members search each other's documents (team-shared corpora)
+RAG_SHARED_CORPUS_GROUPS = [g.strip() for g in os.environ.get('RAG_SHARED_CORPUS_GROUPS', '').split(',') if g.strip()]
+
 # CORS settings
 # Allow during development from local frontends; tighten in production
 CORS_ALLOWED_ORIGINS = [
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rag_chatbot.settings')
 
 application = get_wsgi_application()
+
+# Load the RAG stack before serving when RAG_WARMUP_ON_STARTUP is enabled
+from chatbot.warmup import warm_up_if_enabled  # noqa: E402
+
+warm_up_if_enabled()